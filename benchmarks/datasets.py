@@ -0,0 +1,94 @@
+# --- SENTETİK VERİ SETLERİ ---
+# İlanlar sabit bir tohumdan üretilir; aynı boyut ve tohum her çalıştırmada aynı veriyi
+# verir, böylece sonuçlar çalıştırmalar arasında karşılaştırılabilir.
+import random
+
+import numpy as np
+
+from benchmarks.fakes import EMBEDDING_DIM
+
+DATASET_SIZES = {"1k": 1_000, "100k": 100_000, "1m": 1_000_000}
+
+ROLES = [
+    "Backend Engineer", "Frontend Developer", "Data Scientist", "DevOps Engineer", "Product Manager",
+    "QA Engineer", "Mobile Developer", "Machine Learning Engineer", "Security Analyst", "Data Engineer",
+    "Site Reliability Engineer", "UX Designer", "Cloud Architect", "Business Analyst", "Embedded Engineer",
+]
+LEVELS = ["Junior", "Mid-level", "Senior", "Lead", "Principal"]
+SKILLS = [
+    "python", "java", "go", "rust", "typescript", "react", "kubernetes", "docker", "terraform", "aws",
+    "gcp", "azure", "postgresql", "mongodb", "kafka", "spark", "airflow", "pytorch", "tensorflow", "sql",
+    "linux", "graphql", "django", "flask", "fastapi", "spring", "kotlin", "swift", "figma", "tableau",
+    "cissp", "pmp", "scrum", "ci/cd", "redis", "elasticsearch", "snowflake", "dbt", "c++", "opencv",
+]
+FILLER = [
+    "We are looking for a motivated colleague to join our growing team.",
+    "You will collaborate with cross-functional teams to ship reliable products.",
+    "Remote-friendly position with flexible working hours.",
+    "Experience in a fast-paced startup environment is a plus.",
+    "Strong communication skills in English are required.",
+]
+
+
+def parse_sizes(spec):
+    # "1k,100k" -> [("1k", 1000), ("100k", 100000)]; düz sayılar da kabul edilir.
+    sizes = []
+    for name in spec.split(","):
+        name = name.strip().lower()
+        if name:
+            sizes.append((name, DATASET_SIZES.get(name) or int(name)))
+    return sizes
+
+
+def synthetic_job(rng):
+    role = rng.choice(ROLES)
+    skills = rng.sample(SKILLS, rng.randint(4, 8))
+    title = f"{rng.choice(LEVELS)} {role}"
+    description = " ".join([
+        f"{title} wanted.",
+        f"Required skills: {', '.join(skills)}.",
+        f"{rng.randint(1, 10)}+ years of experience.",
+        *rng.sample(FILLER, 2),
+    ])
+    return title, description
+
+
+def iter_job_rows(count, seed=0):
+    # bulk_ingest_jobs'un beklediği (satır no, başlık, açıklama) üçlüleri.
+    rng = random.Random(seed)
+    for row in range(count):
+        title, description = synthetic_job(rng)
+        yield row, title, description
+
+
+def synthetic_cv(seed):
+    rng = random.Random(seed)
+    role = rng.choice(ROLES)
+    skills = rng.sample(SKILLS, 6)
+    return (
+        f"{rng.choice(LEVELS)} {role} with {rng.randint(1, 12)} years of experience. "
+        f"Skills: {', '.join(skills)}. Worked on production systems at several companies."
+    )
+
+
+def _cluster_centers(dim, clusters, seed):
+    return np.random.default_rng(seed).standard_normal((clusters, dim)).astype(np.float32)
+
+
+def _clustered_vectors(rng, centers, rows, dim):
+    vectors = centers[rng.integers(0, len(centers), rows)] + 0.6 * rng.standard_normal((rows, dim), dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def iter_job_vectors(count, dim=EMBEDDING_DIM, clusters=256, chunk_rows=50_000, seed=0):
+    # Retrieval benchmark'ı için metinsiz vektörler: gerçek embedding'ler gibi kümelenmiş,
+    # birim uzunlukta. 1M satır parça parça üretilir, tek seferde float64 matris oluşmaz.
+    centers = _cluster_centers(dim, clusters, seed)
+    rng = np.random.default_rng(seed + 1)
+    for start in range(0, count, chunk_rows):
+        yield start, _clustered_vectors(rng, centers, min(chunk_rows, count - start), dim)
+
+
+def query_vectors(count, dim=EMBEDDING_DIM, clusters=256, seed=0):
+    # Sorgular ilanlarla aynı kümelerden gelir, ama ilan vektörlerinin kopyası değildir.
+    return _clustered_vectors(np.random.default_rng(seed + 2), _cluster_centers(dim, clusters, seed), count, dim)
@@ -0,0 +1,273 @@
+# --- SAHTE ARKA UÇLAR ---
+# Firestore, Gemini ve embedding API'sinin yerine geçen süreç içi nesneler. Uygulama
+# modülünün global'lerine (db, gemini_model, summary_model, embed_content) takılırlar;
+# böylece sıcak yollar kimlik bilgisi veya ağ olmadan ölçülebilir.
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+
+import numpy as np
+from firebase_admin import firestore
+from google.api_core import exceptions as google_exceptions
+
+EMBEDDING_DIM = 768
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def _simulate_latency(seconds, jitter, rng):
+    if seconds > 0:
+        time.sleep(max(0.0, rng.gauss(seconds, seconds * jitter)))
+
+
+# --- Firestore ---
+class FakeSnapshot:
+    def __init__(self, reference, data):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        return dict(self._data) if self._data is not None else None
+
+
+class FakeDocumentReference:
+    def __init__(self, store, collection, doc_id):
+        self._store = store
+        self.collection_name = collection
+        self.id = doc_id
+
+    def get(self, field_paths=None):
+        self._store.stats["reads"] += 1
+        return FakeSnapshot(self, self._store.read(self.collection_name, self.id, field_paths))
+
+    def set(self, data, merge=False):
+        self._store.write(self.collection_name, self.id, data, merge)
+
+    def update(self, data):
+        if self._store.read(self.collection_name, self.id) is None:
+            raise google_exceptions.NotFound(f"{self.collection_name}/{self.id}")
+        self._store.write(self.collection_name, self.id, data, merge=True)
+
+
+class FakeAggregation:
+    def __init__(self, value):
+        self.value = value
+
+
+class FakeQuery:
+    def __init__(self, store, collection, field_paths=None):
+        self._store = store
+        self._collection = collection
+        self._field_paths = field_paths
+
+    def select(self, field_paths):
+        return FakeQuery(self._store, self._collection, list(field_paths))
+
+    def stream(self):
+        # Gerçek stream gibi tembel: belgeler tek tek üretilir.
+        for doc_id in list(self._store.documents(self._collection)):
+            data = self._store.read(self._collection, doc_id, self._field_paths)
+            if data is not None:
+                self._store.stats["reads"] += 1
+                yield FakeSnapshot(FakeDocumentReference(self._store, self._collection, doc_id), data)
+
+    def count(self):
+        return self
+
+    def get(self):
+        return [[FakeAggregation(len(self._store.documents(self._collection)))]]
+
+
+class FakeCollection(FakeQuery):
+    def document(self, doc_id=None):
+        return FakeDocumentReference(self._store, self._collection, doc_id or self._store.auto_id())
+
+
+class FakeWriteBatch:
+    def __init__(self, store):
+        self._store = store
+        self._writes = []
+
+    def set(self, reference, data, merge=False):
+        self._writes.append((reference, data, merge, False))
+
+    def update(self, reference, data):
+        self._writes.append((reference, data, True, True))
+
+    def commit(self):
+        self._store.commit(self._writes)
+
+
+class FakeFirestore:
+    # Koleksiyon adı -> {belge id -> sözlük}. Commit başına gecikme ve hata oranı ayarlanabilir;
+    # batch'ler atomik uygulanır, update() olmayan belgede gerçek istemci gibi NotFound fırlatır.
+    def __init__(self, commit_latency=0.0, read_latency=0.0, failure_rate=0.0, seed=0):
+        self.commit_latency = commit_latency
+        self.read_latency = read_latency
+        self.failure_rate = failure_rate
+        self._collections = {}
+        self._lock = threading.Lock()
+        self._rng = random.Random(seed)
+        self._ids = 0
+        self.stats = {"reads": 0, "writes": 0, "commits": 0, "failed_commits": 0}
+
+    def collection(self, name):
+        return FakeCollection(self, name)
+
+    def batch(self):
+        return FakeWriteBatch(self)
+
+    def get_all(self, references, field_paths=None):
+        _simulate_latency(self.read_latency, 0.2, self._rng)
+        for reference in references:
+            self.stats["reads"] += 1
+            yield FakeSnapshot(reference, self.read(reference.collection_name, reference.id, field_paths))
+
+    def auto_id(self):
+        with self._lock:
+            self._ids += 1
+            return f"auto{self._ids:012d}"
+
+    def documents(self, collection):
+        with self._lock:
+            return list(self._collections.get(collection, {}))
+
+    def read(self, collection, doc_id, field_paths=None):
+        with self._lock:
+            data = self._collections.get(collection, {}).get(doc_id)
+            if data is None:
+                return None
+            if field_paths is None:
+                return dict(data)
+            return {field: data[field] for field in field_paths if field in data}
+
+    def write(self, collection, doc_id, data, merge=False):
+        with self._lock:
+            self._apply(collection, doc_id, data, merge)
+
+    def commit(self, writes):
+        _simulate_latency(self.commit_latency, 0.2, self._rng)
+        with self._lock:
+            if self._rng.random() < self.failure_rate:
+                self.stats["failed_commits"] += 1
+                raise google_exceptions.ServiceUnavailable("Simulated Firestore outage")
+            for reference, _, _, must_exist in writes:
+                if must_exist and reference.id not in self._collections.get(reference.collection_name, {}):
+                    raise google_exceptions.NotFound(f"{reference.collection_name}/{reference.id}")
+            for reference, data, merge, _ in writes:
+                self._apply(reference.collection_name, reference.id, data, merge)
+            self.stats["commits"] += 1
+
+    def _apply(self, collection, doc_id, data, merge):
+        documents = self._collections.setdefault(collection, {})
+        current = dict(documents.get(doc_id, {})) if merge else {}
+        for field, value in data.items():
+            if value is firestore.DELETE_FIELD:
+                current.pop(field, None)
+            elif value is firestore.SERVER_TIMESTAMP:
+                current[field] = time.time()
+            elif isinstance(value, firestore.Increment):
+                current[field] = current.get(field, 0) + value.value
+            else:
+                current[field] = value
+        documents[doc_id] = current
+        self.stats["writes"] += 1
+
+
+# --- Embedding ---
+def hashed_embedding(text, dim=EMBEDDING_DIM):
+    # Deterministik "bag of words" vektörü: her kelime sabit bir boyuta ±1 ekler. Ortak kelimesi
+    # çok olan metinler yakın düşer, böylece arama sonuçları anlamlı kalır.
+    vector = np.zeros(dim, dtype=np.float32)
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        digest = int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+        vector[digest % dim] += 1.0 if (digest >> 32) & 1 else -1.0
+    norm = np.linalg.norm(vector)
+    return (vector / norm if norm else vector).tolist()
+
+
+class FakeEmbedder:
+    # genai.embed_content ile aynı imza ve dönüş şekli; tek metin veya liste kabul eder.
+    def __init__(self, latency=0.0, per_text_latency=0.0, failure_rate=0.0, dim=EMBEDDING_DIM, seed=0):
+        self.latency = latency
+        self.per_text_latency = per_text_latency
+        self.failure_rate = failure_rate
+        self.dim = dim
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def __call__(self, model, content, task_type=None, **kwargs):
+        texts = [content] if isinstance(content, str) else list(content)
+        with self._lock:
+            self.calls += 1
+            failed = self._rng.random() < self.failure_rate
+        _simulate_latency(self.latency + self.per_text_latency * len(texts), 0.2, self._rng)
+        if failed:
+            raise google_exceptions.ResourceExhausted("Simulated embedding quota error")
+        vectors = [hashed_embedding(text, self.dim) for text in texts]
+        return {"embedding": vectors[0] if isinstance(content, str) else vectors}
+
+
+# --- Gemini ---
+class FakeUsage:
+    def __init__(self, prompt_token_count, candidates_token_count):
+        self.prompt_token_count = prompt_token_count
+        self.candidates_token_count = candidates_token_count
+
+
+class FakeResponse:
+    def __init__(self, text, prompt_tokens):
+        self.text = text
+        self.prompt_feedback = None
+        self.usage_metadata = FakeUsage(prompt_tokens, len(text) // 4)
+
+
+class StubGeminiModel:
+    # generate_content yerine geçer: gecikme Gauss dağılımlı, hatalar yeniden denenebilir
+    # türden (503) ve skor isteğin hash'inden türetildiği için tekrar üretilebilir.
+    def __init__(self, latency=0.8, jitter=0.3, failure_rate=0.0, json_output=True, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.json_output = json_output
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def generate_content(self, prompt, **kwargs):
+        with self._lock:
+            self.calls += 1
+            failed = self._rng.random() < self.failure_rate
+            delay = max(0.0, self._rng.gauss(self.latency, self.latency * self.jitter))
+        time.sleep(delay)
+        if failed:
+            raise google_exceptions.ServiceUnavailable("Simulated Gemini overload")
+        digest = hashlib.sha256(prompt.encode("utf-8")).digest()
+        if not self.json_output:
+            return FakeResponse("Synthetic CV summary. " + prompt[:200], len(prompt) // 4)
+        analysis = {
+            "score": digest[0] * 100 // 255,
+            "pros": ["Relevant experience", "Matching skills", "Good education"],
+            "cons": ["Missing certification", "Short tenure", "No domain experience"],
+            "summary": "Synthetic analysis produced by the benchmark stub.",
+        }
+        return FakeResponse(json.dumps(analysis), len(prompt) // 4)
+
+
+def install_fake_backends(app, db=None, embedder=None, analysis_model=None, summary_model=None):
+    # Uygulama modülünün arka uç global'lerini değiştirir ve süreç içi önbellekleri sıfırlar.
+    app.db = db or FakeFirestore()
+    app.embed_content = embedder or FakeEmbedder()
+    app.gemini_model = analysis_model or StubGeminiModel()
+    app.summary_model = summary_model or StubGeminiModel(json_output=False)
+    app.st.cache_resource.clear()
+    app.st.cache_data.clear()
+    return app.db, app.embed_content, app.gemini_model
@@ -0,0 +1,363 @@
+# --- OFFLINE BENCHMARK ÇALIŞTIRICI ---
+# Firebase/Gemini kimlik bilgisi gerektirmez: uygulama modülü import edilir (__main__ olmadığı
+# için başlangıç bağlantıları kurulmaz) ve arka uçları benchmarks.fakes ile değiştirilir.
+#
+# Depo kökünden:
+#   python -m benchmarks.run_benchmarks --sizes 1k,100k
+#   python -m benchmarks.run_benchmarks --only retrieval --sizes 1m
+#   python -m benchmarks.run_benchmarks --compare benchmarks/results/baseline.json
+import argparse
+import concurrent.futures
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import streamlit.logger
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+streamlit.logger.set_log_level("error")       # "bare mode" uyarıları çıktıyı boğmasın
+
+import streamlit_app as app
+from benchmarks.datasets import iter_job_rows, iter_job_vectors, parse_sizes, query_vectors, synthetic_cv
+from benchmarks.fakes import FakeEmbedder, FakeFirestore, StubGeminiModel, install_fake_backends
+
+RESULTS_DIR = os.path.join(REPO_ROOT, "benchmarks", "results")
+BENCHMARKS = ("retrieval", "ingest", "end_to_end", "quality")
+REGRESSION_THRESHOLD = 0.10
+
+
+def percentiles(samples_ms):
+    samples = np.asarray(samples_ms, dtype=np.float64)
+    if samples.size == 0:
+        return {}
+    return {f"p{q}_ms": float(np.percentile(samples, q)) for q in (50, 95, 99)}
+
+
+# --- Aday arama ---
+def bench_retrieval(size_name, count, n_queries=200, k=10, nprobe=app.IVF_DEFAULT_NPROBE):
+    index = app.VectorIndex()
+    start = time.perf_counter()
+    for offset, vectors in iter_job_vectors(count):
+        ids = [f"job{offset + i:07d}" for i in range(len(vectors))]
+        index.add_many(ids, ids, vectors)
+    load_s = time.perf_counter() - start
+    view = index.snapshot()[0]
+    searcher = app.ANNSearcher(index)
+    queries = query_vectors(n_queries)
+
+    exact_ms, exact_results = [], []
+    for query in queries:
+        t0 = time.perf_counter()
+        found, _ = searcher.search(view, query, k, backend=app.SEARCH_BACKENDS[0])
+        exact_ms.append((time.perf_counter() - t0) * 1000)
+        exact_results.append(found)
+    result = {
+        "rows": count,
+        "index_load_s": load_s,
+        "index_mb": view.codes.nbytes / 2**20,
+        "exact": percentiles(exact_ms),
+    }
+
+    if count >= app.IVF_MIN_SIZE:
+        t0 = time.perf_counter()
+        searcher.wait_for_ivf(view)
+        result["ivf_build_s"] = time.perf_counter() - t0
+        ivf_ms, hits = [], 0
+        for query, expected in zip(queries, exact_results):
+            t0 = time.perf_counter()
+            found, _ = searcher.search(view, query, k, backend=app.SEARCH_BACKENDS[1], nprobe=nprobe)
+            ivf_ms.append((time.perf_counter() - t0) * 1000)
+            hits += len(np.intersect1d(expected, found))
+        result["ivf"] = {**percentiles(ivf_ms), "recall": hits / (len(queries) * k), "nprobe": nprobe}
+    print(f"[retrieval/{size_name}] load {load_s:.1f}s, exact p50 {result['exact']['p50_ms']:.2f} ms"
+          + (f", IVF p50 {result['ivf']['p50_ms']:.2f} ms (recall {result['ivf']['recall']:.3f})" if "ivf" in result else ""))
+    return result
+
+
+# --- Toplu yükleme ---
+def bench_ingest(size_name, count, args):
+    db, embedder, _ = install_fake_backends(
+        app,
+        db=FakeFirestore(commit_latency=args.firestore_latency, failure_rate=args.firestore_failure_rate),
+        embedder=FakeEmbedder(latency=args.embedding_latency),
+    )
+    app.get_job_index()
+    start = time.perf_counter()
+    _, stats = app.bulk_ingest_jobs(iter_job_rows(count), f"bench-{size_name}-a".ljust(16, "0"), "benchmark", count)
+    ingest_s = time.perf_counter() - start
+    # Aynı satırlar farklı bir yükleme olarak tekrar gönderilir: hepsi tekilleştirmeye takılmalı.
+    start = time.perf_counter()
+    _, repeat_stats = app.bulk_ingest_jobs(iter_job_rows(count), f"bench-{size_name}-b".ljust(16, "0"), "benchmark", count)
+    reingest_s = time.perf_counter() - start
+    result = {
+        "rows": count,
+        "ingest_s": ingest_s,
+        "rows_per_s": count / ingest_s,
+        "reingest_s": reingest_s,
+        "duplicate_rows_per_s": count / reingest_s,
+        **stats,
+        "repeat_duplicates": repeat_stats["duplicates"],
+        "embedding_calls": embedder.calls,
+        "firestore_commits": db.stats["commits"],
+    }
+    print(f"[ingest/{size_name}] {result['rows_per_s']:.0f} rows/s, {stats['uploaded']} uploaded, "
+          f"{stats['failed']} failed, re-upload {result['duplicate_rows_per_s']:.0f} rows/s")
+    return result
+
+
+# --- Uçtan uca eşleştirme ---
+def match_once(session_id, cv_text, pool_size, backend, hybrid=False):
+    # Auto-Matcher'ın 1. ve 2. adımlarının arayüzsüz hali; aşamalar uygulamanın izleyicisine yazılır.
+    trace = app.RequestTrace("benchmark_match", session_id)
+    app.current_trace.set(trace)
+    start = time.perf_counter()
+    job_vectors, job_ids, job_titles = app.get_job_index().snapshot()
+    cv_vector = app.get_embedding(cv_text)
+    with app.trace_stage("vector_search", backend=backend, rows=len(job_ids), hybrid=hybrid):
+        if hybrid:
+            indices, _ = app.hybrid_search(job_vectors, np.asarray(cv_vector, dtype=np.float32), cv_text, pool_size, backend=backend)
+        else:
+            indices, _ = app.get_job_searcher().search(job_vectors, np.asarray(cv_vector, dtype=np.float32), pool_size, backend=backend)
+    with app.trace_stage("description_fetch", rows=len(indices)):
+        descriptions = app.fetch_job_descriptions([job_ids[index] for index in indices])
+    cv_hash = app.text_hash(cv_text)
+    prepared_cv = app.prepare_cvs_for_analysis([cv_text])[cv_text]
+    scheduler = app.get_gemini_scheduler()
+    futures = []
+    for index in indices:
+        description = descriptions.get(job_ids[index], "")
+        job = {"id": job_ids[index], "title": job_titles[index], "description": description, "hash": app.text_hash(description)}
+        futures.append(scheduler.submit(session_id, "analysis", app.analyze_and_cache, prepared_cv, cv_hash, job))
+    failures = 0
+    for future in concurrent.futures.as_completed(futures):
+        try:
+            if not future.result():
+                failures += 1
+        except Exception:
+            failures += 1
+    app.finish_trace(trace, "ok" if failures < len(futures) else "analysis_failed")
+    return (time.perf_counter() - start) * 1000, failures
+
+
+def bench_end_to_end(size_name, count, args):
+    install_fake_backends(
+        app,
+        db=FakeFirestore(read_latency=args.firestore_latency),
+        embedder=FakeEmbedder(latency=args.embedding_latency),
+        analysis_model=StubGeminiModel(latency=args.gemini_latency, failure_rate=args.gemini_failure_rate),
+    )
+    app.bulk_ingest_jobs(iter_job_rows(count), f"bench-e2e-{size_name}".ljust(16, "0"), "benchmark", count)
+    backend = app.SEARCH_BACKENDS[1] if args.backend == "ivf" else app.SEARCH_BACKENDS[0]
+    pool_size = args.pool_size or (app.HYBRID_CANDIDATE_POOL_SIZE if args.hybrid else app.VECTOR_CANDIDATE_POOL_SIZE)
+    latencies, failures = [], 0
+    lock = threading.Lock()
+
+    def run_session(session):
+        nonlocal failures
+        for i in range(args.matches_per_session):
+            ms, failed = match_once(f"bench-session-{session}", synthetic_cv(session * 1000 + i), pool_size, backend, args.hybrid)
+            with lock:
+                latencies.append(ms)
+                failures += failed
+
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=args.sessions) as executor:
+        list(executor.map(run_session, range(args.sessions)))
+    wall_s = time.perf_counter() - start
+    result = {
+        "rows": count,
+        "sessions": args.sessions,
+        "pool_size": pool_size,
+        "hybrid": args.hybrid,
+        "matches": len(latencies),
+        "matches_per_s": len(latencies) / wall_s,
+        "analysis_failures": failures,
+        "match": percentiles(latencies),
+        "stages": {row["stage"]: {k: v for k, v in row.items() if k != "stage"} for row in app.get_tracer().stage_stats()},
+        "scheduler": app.get_gemini_scheduler().metrics(),
+    }
+    print(f"[end_to_end/{size_name}] {args.sessions} sessions: match p50 {result['match']['p50_ms']:.0f} ms / "
+          f"p95 {result['match']['p95_ms']:.0f} ms, {result['matches_per_s']:.2f} matches/s, {failures} failed analyses")
+    return result
+
+
+# --- Aday havuzu kalitesi ---
+SKILLS_PATTERN = re.compile(r"skills: ([^.]+)\.", re.IGNORECASE)
+
+
+def relevance(cv_text, job_text):
+    # Sentetik veride bilinen ilgi: ortak beceri sayısı + rol aynıysa 2 puan.
+    cv_skills = set(SKILLS_PATTERN.search(cv_text).group(1).split(", "))
+    job_skills = set(SKILLS_PATTERN.search(job_text).group(1).split(", "))
+    same_role = cv_text.split(" with ", 1)[0].split(" ", 1)[1] in job_text.split(" wanted.", 1)[0]
+    return len(cv_skills & job_skills) + 2 * same_role
+
+
+def best_relevance(pool, relevances, top_n):
+    # Gemini havuzdan en iyi top_n ilanı seçiyormuş gibi: havuzdaki en ilgili top_n ilanın ortalaması.
+    return float(np.mean(sorted((relevances[row] for row in pool), reverse=True)[:top_n]))
+
+
+def bench_quality(size_name, count, args, n_cvs=200, top_n=5):
+    # Hibrit havuzun (HYBRID_CANDIDATE_POOL_SIZE) vektör havuzu (VECTOR_CANDIDATE_POOL_SIZE) kadar
+    # iyi aday içerip içermediğini ölçer. Not: sahte embedding kelime tabanlı olduğundan vektör
+    # tarafı gerçek embedding'den daha "sözcüksel"dir; sonuç gerçek veride de doğrulanmalıdır.
+    install_fake_backends(app, embedder=FakeEmbedder())
+    upload_id = f"bench-qual-{size_name}".ljust(16, "0")
+    app.bulk_ingest_jobs(iter_job_rows(count), upload_id, "benchmark", count)
+    # Toplu yükleme belge id'si "<upload_id[:16]>_<satır>" olduğundan indeks satırı metne geri bağlanabilir.
+    job_texts = {f"{upload_id[:16]}_{row:07d}": f"{title} {description}" for row, title, description in iter_job_rows(count)}
+    view, job_ids, _ = app.get_job_index().snapshot()
+    text_of_row = [job_texts[job_id] for job_id in job_ids]
+    vector_pool, hybrid_pool = app.VECTOR_CANDIDATE_POOL_SIZE, app.HYBRID_CANDIDATE_POOL_SIZE
+    totals = {"vector": 0.0, "hybrid": 0.0, "ideal": 0.0, "overlap": 0.0}
+    for i in range(n_cvs):
+        cv_text = synthetic_cv(10_000 + i)
+        relevances = np.array([relevance(cv_text, text) for text in text_of_row])
+        query = np.asarray(app.get_embedding(cv_text), dtype=np.float32)
+        vector_rows, _ = app.get_job_searcher().search(view, query, vector_pool)
+        hybrid_rows, _ = app.hybrid_search(view, query, cv_text, hybrid_pool)
+        totals["vector"] += best_relevance(vector_rows, relevances, top_n)
+        totals["hybrid"] += best_relevance(hybrid_rows, relevances, top_n)
+        totals["ideal"] += float(np.mean(np.sort(relevances)[::-1][:top_n]))
+        totals["overlap"] += len(np.intersect1d(hybrid_rows, vector_rows)) / len(hybrid_rows)
+    result = {
+        "rows": count,
+        "cvs": n_cvs,
+        "vector_pool": vector_pool,
+        "hybrid_pool": hybrid_pool,
+        f"vector_top{vector_pool}_best{top_n}_relevance": totals["vector"] / n_cvs,
+        f"hybrid_top{hybrid_pool}_best{top_n}_relevance": totals["hybrid"] / n_cvs,
+        f"ideal_best{top_n}_relevance": totals["ideal"] / n_cvs,
+        f"hybrid_overlap_with_vector_top{vector_pool}": totals["overlap"] / n_cvs,
+    }
+    print(f"[quality/{size_name}] best-{top_n} relevance: vector@{vector_pool} {totals['vector'] / n_cvs:.2f}, "
+          f"hybrid@{hybrid_pool} {totals['hybrid'] / n_cvs:.2f}, ideal {totals['ideal'] / n_cvs:.2f}; "
+          f"overlap {totals['overlap'] / n_cvs:.0%}")
+    return result
+
+
+# --- Sonuç kaydı ve karşılaştırma ---
+def flatten(results, prefix=""):
+    flat = {}
+    for key, value in results.items():
+        path = f"{prefix}/{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten(value, path))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[path] = value
+    return flat
+
+
+def metric_direction(path):
+    # +1: büyük olan iyi, -1: küçük olan iyi, 0: sadece bilgi amaçlı.
+    name = path.rsplit("/", 1)[-1]
+    if name.endswith("_per_s") or name == "recall" or name.endswith("_relevance"):
+        return 1
+    if name.endswith("_ms") or name.endswith("_s") or name.endswith("_mb"):
+        return -1
+    return 0
+
+
+def compare(current, baseline, threshold=REGRESSION_THRESHOLD):
+    current_flat, baseline_flat = flatten(current["results"]), flatten(baseline["results"])
+    regressions = []
+    for path in sorted(current_flat.keys() & baseline_flat.keys()):
+        direction = metric_direction(path)
+        old, new = baseline_flat[path], current_flat[path]
+        if direction == 0 or old == 0:
+            continue
+        change = (new - old) / abs(old)
+        regressed = change * direction < -threshold
+        if regressed:
+            regressions.append(path)
+        print(f"{'REGRESSION' if regressed else '':>10}  {path:<60} {old:>12.3f} -> {new:>12.3f} ({change:+.1%})")
+    return regressions
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the CV matching hot paths.")
+    parser.add_argument("--only", default=",".join(BENCHMARKS), help=f"Comma-separated subset of {', '.join(BENCHMARKS)}")
+    parser.add_argument("--sizes", default="1k,100k", help="Dataset sizes for retrieval/ingest (1k, 100k, 1m or a number)")
+    parser.add_argument("--e2e-size", default="1k", help="Job pool size for the end-to-end benchmark")
+    parser.add_argument("--quality-size", default="10000", help="Job pool size for the candidate-quality benchmark")
+    parser.add_argument("--sessions", type=int, default=8, help="Concurrent sessions in the end-to-end benchmark")
+    parser.add_argument("--matches-per-session", type=int, default=3)
+    parser.add_argument("--pool-size", type=int, default=0, help="Candidates analyzed per match (default: the app's pool size for the mode)")
+    parser.add_argument("--hybrid", action="store_true", help="Use hybrid keyword + vector retrieval in the end-to-end benchmark")
+    parser.add_argument("--backend", choices=["exact", "ivf"], default="exact")
+    parser.add_argument("--queries", type=int, default=200, help="Queries per retrieval benchmark")
+    parser.add_argument("--gemini-latency", type=float, default=0.8, help="Mean seconds per stubbed Gemini analysis")
+    parser.add_argument("--gemini-failure-rate", type=float, default=0.0)
+    parser.add_argument("--embedding-latency", type=float, default=0.05, help="Seconds per stubbed embedding request")
+    parser.add_argument("--firestore-latency", type=float, default=0.0, help="Seconds per fake Firestore commit/read")
+    parser.add_argument("--firestore-failure-rate", type=float, default=0.0)
+    parser.add_argument("--output", help="Result file (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--compare", help="Earlier result file to compare against")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD, help="Relative change counted as a regression")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    selected = [name.strip() for name in args.only.split(",") if name.strip()]
+    output = os.path.abspath(args.output or os.path.join(RESULTS_DIR, time.strftime("%Y%m%d-%H%M%S") + ".json"))
+    baseline_path = os.path.abspath(args.compare) if args.compare else None
+
+    # Önbellek dosyaları (.cache/) çalışma dizinine yazıldığından her çalıştırma boş bir dizinde başlar.
+    workdir = tempfile.mkdtemp(prefix="cv-matching-bench-")
+    os.chdir(workdir)
+
+    results = {}
+    sizes = parse_sizes(args.sizes)
+    if "retrieval" in selected:
+        results["retrieval"] = {name: bench_retrieval(name, count, n_queries=args.queries) for name, count in sizes}
+    if "ingest" in selected:
+        results["ingest"] = {name: bench_ingest(name, count, args) for name, count in sizes}
+    if "end_to_end" in selected:
+        name, count = parse_sizes(args.e2e_size)[0]
+        results["end_to_end"] = {name: bench_end_to_end(name, count, args)}
+    if "quality" in selected:
+        name, count = parse_sizes(args.quality_size)[0]
+        results["quality"] = {name: bench_quality(name, count, args)}
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": f"{platform.system()} {platform.machine()}, {os.cpu_count()} CPUs",
+        "args": vars(args),
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+
+    if baseline_path:
+        with open(baseline_path, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        if regressions:
+            print(f"{len(regressions)} metric(s) regressed by more than {args.threshold:.0%}.")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
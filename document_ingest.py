@@ -0,0 +1,84 @@
+# --- BELGE METİN ÇIKARMA ---
+# Bu modül Streamlit'e bağımlı değildir: süreç havuzundaki işçiler onu doğrudan
+# import eder. Dosyalar yol olarak verilir ve sayfa sayfa okunur; işçiye hiçbir
+# zaman dosyanın tamamı bayt olarak gönderilmez.
+import os
+import re
+import time
+import unicodedata
+import multiprocessing
+import concurrent.futures
+
+SUPPORTED_EXTENSIONS = (".pdf", ".docx", ".txt")
+
+
+def _iter_pdf_pages(path):
+    import pymupdf
+    with pymupdf.open(path) as document:
+        for page in document:
+            yield page.get_text()
+
+
+def _iter_docx_paragraphs(path):
+    import docx
+    document = docx.Document(path)
+    for paragraph in document.paragraphs:
+        yield paragraph.text
+    for table in document.tables:
+        for row in table.rows:
+            yield " | ".join(cell.text for cell in row.cells)
+
+
+def _iter_txt_lines(path):
+    with open(path, encoding="utf-8", errors="replace") as f:
+        yield from f
+
+
+def normalize_extracted_text(text):
+    text = unicodedata.normalize("NFC", text).replace("\u00ad", "")
+    text = re.sub(r"(\w)-\n(\w)", r"\1\2", text)          # satır sonunda bölünmüş kelimeler
+    text = re.sub(r"[ \t\u00a0]+", " ", text)
+    text = re.sub(r" *\n *", "\n", text)
+    text = re.sub(r"\n{3,}", "\n\n", text)
+    return text.strip()
+
+
+def extract_text(path):
+    # (metin, parça sayısı, saniye) döner; parça PDF'te sayfa, DOCX'te paragraf demektir.
+    start = time.perf_counter()
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".pdf":
+        parts = _iter_pdf_pages(path)
+    elif extension == ".docx":
+        parts = _iter_docx_paragraphs(path)
+    elif extension == ".txt":
+        parts = _iter_txt_lines(path)
+    else:
+        raise ValueError(f"Unsupported file type: {extension}")
+    chunks = []
+    count = 0
+    for part in parts:
+        chunks.append(part)
+        count += 1
+    separator = "" if extension == ".txt" else "\n"
+    return normalize_extracted_text(separator.join(chunks)), count, time.perf_counter() - start
+
+
+def create_extraction_pool(max_workers=None):
+    # "spawn": ana süreçte çalışan thread'ler (Gemini zamanlayıcısı vb.) fork ile kopyalanmasın.
+    return concurrent.futures.ProcessPoolExecutor(
+        max_workers=max_workers or min(4, os.cpu_count() or 1),
+        mp_context=multiprocessing.get_context("spawn"),
+    )
+
+
+def extract_many(pool, paths):
+    # Sonuçları bittikçe (yol, metin, parça sayısı, saniye, hata) olarak üretir.
+    future_to_path = {pool.submit(extract_text, path): path for path in paths}
+    for future in concurrent.futures.as_completed(future_to_path):
+        path = future_to_path[future]
+        try:
+            text, parts, seconds = future.result()
+            yield path, text, parts, seconds, None
+        except Exception as e:
+            yield path, "", 0, 0.0, e
@@ -5,13 +5,35 @@
 import streamlit as st
 import google.generativeai as genai
 import firebase_admin
+from google.api_core import exceptions as google_exceptions
 from firebase_admin import credentials, firestore, auth
 import json
-import numpy as np
 import re
+import numpy as np
+import pandas as pd
+import openpyxl
 import pyrebase 
+import requests
 import time
+import random
+import threading
+import hashlib
+import sqlite3
+import os
+import unicodedata
+import uuid
+import shutil
+import tempfile
+import zipfile
+import queue
+import contextvars
+from contextlib import contextmanager
+from collections import Counter, OrderedDict, deque
+import itertools
+from array import array
 import concurrent.futures # (YENİ) Paralel API çağrıları için
+from concurrent.futures.process import BrokenProcessPool
+from document_ingest import SUPPORTED_EXTENSIONS, create_extraction_pool, extract_many
 
 # --- Sayfa Ayarları ---
 st.set_page_config(
@@ -53,86 +75,1290 @@ def init_firebase_auth():
         st.stop()
 
 # --- 3. GEMINI AI BAĞLANTISI ---
+ANALYSIS_MODEL = 'models/gemini-flash-latest'
+ANALYSIS_RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "score": {"type": "integer"},
+        "pros": {"type": "array", "items": {"type": "string"}},
+        "cons": {"type": "array", "items": {"type": "string"}},
+        "summary": {"type": "string"},
+    },
+    "required": ["score", "pros", "cons", "summary"],
+}
+
 @st.cache_resource
 def init_gemini():
     try:
         genai.configure(api_key=st.secrets["GEMINI_API_KEY"])
-        generation_config = genai.types.GenerationConfig(response_mime_type="application/json")
-        analysis_model = genai.GenerativeModel('models/gemini-flash-latest', generation_config=generation_config)
+        generation_config = genai.types.GenerationConfig(
+            response_mime_type="application/json",
+            response_schema=ANALYSIS_RESPONSE_SCHEMA
+        )
+        analysis_model = genai.GenerativeModel(ANALYSIS_MODEL, generation_config=generation_config)
+        # Analiz modeli JSON şemasına bağlı olduğundan özet için düz metin dönen ayrı bir örnek kullanılır.
+        summary_model = genai.GenerativeModel(ANALYSIS_MODEL)
         embedding_model = genai.GenerativeModel('models/text-embedding-004')
-        return analysis_model, embedding_model
+        return analysis_model, summary_model, embedding_model
     except Exception as e:
         st.error(f"💎 GEMİNİ BAĞLATMA HATASI: {e}")
         st.stop()
 
+# --- ORTAK GEMİNİ İSTEK ZAMANLAYICISI ---
+GEMINI_MAX_WORKERS = 16
+GEMINI_MAX_RETRIES = 4
+ANALYSIS_REQUESTS_PER_MINUTE = 1000
+EMBEDDING_REQUESTS_PER_MINUTE = 1500
+RETRYABLE_ERRORS = (
+    google_exceptions.Aborted,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.InternalServerError,
+    google_exceptions.ResourceExhausted,
+    google_exceptions.ServiceUnavailable,
+)
+
+def backoff_delay(attempt, base=0.5, cap=30.0):
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+class TokenBucket:
+    def __init__(self, rate_per_second, capacity):
+        self.rate = rate_per_second
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+class GeminiScheduler:
+    # Süreç genelinde tek iş kuyruğu: sabit sayıda işçi thread, model başına token bucket,
+    # oturumlar arasında round-robin (bir oturumun 100 isteği diğerlerini bekletmez) ve
+    # 429/5xx hatalarında jitter'lı yeniden deneme.
+    def __init__(self, max_workers=GEMINI_MAX_WORKERS, rate_limiters=None):
+        self.rate_limiters = rate_limiters or {}
+        self._queues = OrderedDict()
+        self._cond = threading.Condition()
+        self._queue_depth = 0
+        self._in_flight = 0
+        self._waits = deque(maxlen=1000)
+        self._counters = {"submitted": 0, "completed": 0, "failed": 0, "retries": 0, "cancelled": 0}
+        for i in range(max_workers):
+            threading.Thread(target=self._worker_loop, name=f"gemini-worker-{i}", daemon=True).start()
+
+    def submit(self, session_id, kind, fn, *args, **kwargs):
+        future = concurrent.futures.Future()
+        with self._cond:
+            # İstek bağlamı (izleme vb.) işçi thread'e taşınsın diye kopyalanır.
+            context = contextvars.copy_context()
+            self._queues.setdefault(session_id, deque()).append((future, kind, context, fn, args, kwargs, time.monotonic()))
+            self._queue_depth += 1
+            self._counters["submitted"] += 1
+            self._cond.notify()
+        return future
+
+    def _next_job(self):
+        session_id, queue = next(iter(self._queues.items()))
+        job = queue.popleft()
+        if queue:
+            self._queues.move_to_end(session_id)
+        else:
+            del self._queues[session_id]
+        self._queue_depth -= 1
+        return job
+
+    def _call_with_retry(self, kind, fn, args, kwargs):
+        limiter = self.rate_limiters.get(kind)
+        for attempt in range(GEMINI_MAX_RETRIES + 1):
+            if limiter:
+                limiter.acquire()
+            try:
+                return fn(*args, **kwargs)
+            except RETRYABLE_ERRORS:
+                if attempt == GEMINI_MAX_RETRIES:
+                    raise
+                with self._cond:
+                    self._counters["retries"] += 1
+                time.sleep(backoff_delay(attempt))
+
+    def _worker_loop(self):
+        while True:
+            with self._cond:
+                while not self._queues:
+                    self._cond.wait()
+                future, kind, context, fn, args, kwargs, enqueued_at = self._next_job()
+            if not future.set_running_or_notify_cancel():
+                with self._cond:
+                    self._counters["cancelled"] += 1
+                continue
+            with self._cond:
+                self._waits.append(time.monotonic() - enqueued_at)
+                self._in_flight += 1
+            try:
+                future.set_result(context.run(self._call_with_retry, kind, fn, args, kwargs))
+                outcome = "completed"
+            except Exception as e:
+                future.set_exception(e)
+                outcome = "failed"
+            with self._cond:
+                self._in_flight -= 1
+                self._counters[outcome] += 1
+
+    def metrics(self):
+        with self._cond:
+            waits = np.array(self._waits) if self._waits else np.zeros(1)
+            return {
+                "queue_depth": self._queue_depth,
+                "in_flight": self._in_flight,
+                "active_sessions": len(self._queues),
+                "wait_p50_ms": float(np.percentile(waits, 50) * 1000),
+                "wait_p95_ms": float(np.percentile(waits, 95) * 1000),
+                **self._counters,
+            }
+
+@st.cache_resource
+def get_gemini_scheduler():
+    return GeminiScheduler(rate_limiters={
+        "analysis": TokenBucket(ANALYSIS_REQUESTS_PER_MINUTE / 60, GEMINI_MAX_WORKERS),
+        "embedding": TokenBucket(EMBEDDING_REQUESTS_PER_MINUTE / 60, GEMINI_MAX_WORKERS),
+    })
+
+def current_session_id():
+    return st.session_state.get('session_id', 'default')
+
+# --- İSTEK İZLEME (TRACING) ---
+TRACE_JSONL_PATH = os.path.join(".cache", "traces.jsonl")
+TRACE_PROMETHEUS_PATH = os.path.join(".cache", "metrics.prom")
+TRACE_SAMPLES_PER_STAGE = 5000
+TRACE_JSONL_MAX_BYTES = 50 * 1024 * 1024   # Aşılınca traces.jsonl -> traces.jsonl.1 (tek yedek tutulur)
+TRACE_PERCENTILES = (50, 95, 99)
+
+current_trace = contextvars.ContextVar("current_trace", default=None)
+
+class RequestTrace:
+    # Tek bir eşleştirme isteğinin aşamaları; işçi thread'ler de span ekleyebildiği için kilitlidir.
+    def __init__(self, name, session_id):
+        self.name = name
+        self.session_id = session_id
+        self.trace_id = uuid.uuid4().hex
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+    def to_record(self, status):
+        with self._lock:
+            spans = list(self.spans)
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "session_id": self.session_id,
+            "started_at": self.started_at,
+            "total_ms": (time.perf_counter() - self._start) * 1000,
+            "status": status,
+            "spans": spans,
+        }
+
+class Tracer:
+    # Süreç genelinde aşama başına son N gecikme örneği ve önbellek isabet sayıları tutulur.
+    # Biten istekler JSON-lines olarak eklenir, Prometheus metin dosyası her seferinde yenilenir.
+    def __init__(self, jsonl_path=TRACE_JSONL_PATH, prometheus_path=TRACE_PROMETHEUS_PATH):
+        self.jsonl_path = jsonl_path
+        self.prometheus_path = prometheus_path
+        self._samples = {}
+        self._totals = {}
+        self._lock = threading.Lock()
+        self.last_trace = None
+        os.makedirs(os.path.dirname(jsonl_path) or ".", exist_ok=True)
+
+    def observe(self, span):
+        with self._lock:
+            self._samples.setdefault(span["stage"], deque(maxlen=TRACE_SAMPLES_PER_STAGE)).append(span["ms"])
+            totals = self._totals.setdefault(span["stage"], {"count": 0, "sum_ms": 0.0, "cache_hits": 0})
+            totals["count"] += 1
+            totals["sum_ms"] += span["ms"]
+            totals["cache_hits"] += bool(span.get("cache_hit"))
+
+    def stage_stats(self):
+        with self._lock:
+            snapshot = {stage: (np.array(samples), dict(self._totals[stage])) for stage, samples in self._samples.items()}
+        rows = []
+        for stage, (samples, totals) in sorted(snapshot.items()):
+            row = {"stage": stage, "count": totals["count"], "cache_hit_rate": totals["cache_hits"] / totals["count"]}
+            for q in TRACE_PERCENTILES:
+                row[f"p{q}_ms"] = float(np.percentile(samples, q))
+            row["sum_ms"] = totals["sum_ms"]
+            rows.append(row)
+        return rows
+
+    def prometheus_text(self):
+        lines = [
+            "# HELP cv_matching_stage_latency_ms Latency of matching pipeline stages in milliseconds.",
+            "# TYPE cv_matching_stage_latency_ms summary",
+        ]
+        rows = self.stage_stats()
+        for row in rows:
+            label = f'stage="{row["stage"]}"'
+            for q in TRACE_PERCENTILES:
+                lines.append(f'cv_matching_stage_latency_ms{{{label},quantile="{q / 100}"}} {row[f"p{q}_ms"]:.3f}')
+            lines.append(f"cv_matching_stage_latency_ms_sum{{{label}}} {row['sum_ms']:.3f}")
+            lines.append(f"cv_matching_stage_latency_ms_count{{{label}}} {row['count']}")
+        lines.append("# HELP cv_matching_stage_cache_hit_ratio Share of stage executions served from a cache.")
+        lines.append("# TYPE cv_matching_stage_cache_hit_ratio gauge")
+        for row in rows:
+            lines.append(f'cv_matching_stage_cache_hit_ratio{{stage="{row["stage"]}"}} {row["cache_hit_rate"]:.4f}')
+        return "\n".join(lines) + "\n"
+
+    def export(self, record):
+        try:
+            with self._lock:
+                if os.path.exists(self.jsonl_path) and os.path.getsize(self.jsonl_path) >= TRACE_JSONL_MAX_BYTES:
+                    os.replace(self.jsonl_path, f"{self.jsonl_path}.1")
+                with open(self.jsonl_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record) + "\n")
+            # Yarım yazılmış dosya okunmasın diye geçici dosyaya yazılıp yer değiştirilir.
+            tmp_path = f"{self.prometheus_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(self.prometheus_text())
+            os.replace(tmp_path, self.prometheus_path)
+        except OSError as e:
+            print(f"İzleme kaydı yazılamadı: {e}")
+
+    def finish(self, trace, status="ok"):
+        record = trace.to_record(status)
+        self.last_trace = record
+        self.export(record)
+        return record
+
+@st.cache_resource
+def get_tracer():
+    return Tracer()
+
+def start_trace(name):
+    trace = RequestTrace(name, current_session_id())
+    current_trace.set(trace)
+    return trace
+
+def finish_trace(trace, status="ok"):
+    current_trace.set(None)
+    return get_tracer().finish(trace, status)
+
+@contextmanager
+def trace_stage(stage, **attrs):
+    # Aktif bir istek varsa span ona eklenir; yoksa sadece süreç geneli istatistiklere yazılır.
+    # Çağıran, dönen sözlüğe cache_hit gibi alanları sonradan ekleyebilir.
+    span = {"stage": stage, **attrs}
+    start = time.perf_counter()
+    try:
+        yield span
+    finally:
+        span["ms"] = (time.perf_counter() - start) * 1000
+        get_tracer().observe(span)
+        trace = current_trace.get()
+        if trace is not None:
+            trace.add(span)
+
 # --- UYGULAMA BAŞLANGICI ---
-try:
-    db = init_firebase_admin()
-    auth_client = init_firebase_auth()
-    gemini_model, embedding_model = init_gemini()
-except Exception as e:
-    st.error("Uygulama başlatılırken kritik bir hata oluştu.")
-    st.stop()
-
-# --- OTURUM YÖNETİMİ ---
-if 'user_email' not in st.session_state:
-    st.session_state['user_email'] = None
-if 'user_token' not in st.session_state:
-    st.session_state['user_token'] = None
+# Streamlit betiği __main__ olarak çalıştırır. Modül başka yerden import edildiğinde
+# (ör. benchmarks/) bağlantı kurulmaz; arka uçlar bu global'ler üzerinden sahteleriyle değiştirilir.
+db = None
+auth_client = None
+gemini_model = summary_model = embedding_model = None
+embed_content = genai.embed_content
+
+if __name__ == "__main__":
+    try:
+        db = init_firebase_admin()
+        auth_client = init_firebase_auth()
+        gemini_model, summary_model, embedding_model = init_gemini()
+    except Exception as e:
+        st.error("Uygulama başlatılırken kritik bir hata oluştu.")
+        st.stop()
+
+    # --- OTURUM YÖNETİMİ ---
+    if 'user_email' not in st.session_state:
+        st.session_state['user_email'] = None
+    if 'user_token' not in st.session_state:
+        st.session_state['user_token'] = None
+    if 'session_id' not in st.session_state:
+        st.session_state['session_id'] = uuid.uuid4().hex
 
 # --- YARDIMCI FONKSİYONLAR ---
 
-@st.cache_data(ttl=300) 
-def get_platform_stats():
+# Sayaçlar platform_stats/counters belgesinde tutulur ve yazma anında artırılır;
+# belge yoksa bir kereye mahsus count() toplama sorgularıyla doldurulur.
+def platform_counters_ref():
+    return db.collection("platform_stats").document("counters")
+
+def count_collection(name):
     try:
-        job_docs = db.collection("job_postings").stream()
-        total_jobs = sum(1 for _ in job_docs)
-        profile_docs = db.collection("user_profiles").stream()
-        total_profiles = sum(1 for _ in profile_docs)
-        return total_jobs, total_profiles
+        return db.collection(name).count().get()[0][0].value
     except Exception as e:
-        return 0, 0
+        print(f"count() toplama sorgusu başarısız ({name}): {e}")
+        return len(get_job_index()) if name == "job_postings" else 0
 
-@st.cache_data(ttl=3600) 
-def get_total_user_count():
+def seed_platform_counters():
+    counters = {
+        "total_jobs": count_collection("job_postings"),
+        "total_profiles": count_collection("user_profiles"),
+        "total_users": sum(1 for _ in auth.list_users().iterate_all()),
+    }
+    platform_counters_ref().set(counters)
+    return counters
+
+def increment_platform_counter(field, amount=1, batch=None):
+    # update() kullanılır: sayaç belgesi henüz yoksa artış atlanır, ilk okuma tam sayımı yapar.
+    if batch is not None:
+        batch.update(platform_counters_ref(), {field: firestore.Increment(amount)})
+        return
+    try:
+        platform_counters_ref().update({field: firestore.Increment(amount)})
+    except google_exceptions.NotFound:
+        pass
+    except Exception as e:
+        print(f"Platform sayacı güncellenemedi ({field}): {e}")
+
+@st.cache_data(ttl=60) 
+def get_platform_counters():
     try:
-        page = auth.list_users()
-        all_users = list(page.iterate_all())
-        return len(all_users)
+        doc = platform_counters_ref().get()
+        if doc.exists:
+            return doc.to_dict()
+        return seed_platform_counters()
     except Exception as e:
-        return 0
+        return {}
+
+def get_platform_stats():
+    counters = get_platform_counters()
+    return counters.get("total_jobs", 0), counters.get("total_profiles", 0)
+
+def get_total_user_count():
+    return get_platform_counters().get("total_users", 0)
+
+# --- VEKTÖR SAKLAMA FORMATI ---
+VECTOR_STORAGE_DTYPE = "int8"        # "float32", "float16" veya "int8" (vektör başına ölçekli)
+SCORING_CHUNK_ROWS = 4096            # Parça L2 önbelleğe sığacak kadar küçük tutulur
+
+def quantize_vectors(vectors, dtype=VECTOR_STORAGE_DTYPE):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if dtype == "int8":
+        scales = np.abs(vectors).max(axis=1) / 127
+        scales[scales == 0] = 1
+        codes = np.round(vectors / scales[:, None]).astype(np.int8)
+        return codes, scales.astype(np.float32)
+    return vectors.astype(dtype), np.ones(len(vectors), dtype=np.float32)
+
+def encode_vector_fields(vector, prefix="vector", dtype=VECTOR_STORAGE_DTYPE):
+    codes, scales = quantize_vectors([vector], dtype)
+    return {
+        f"{prefix}_q": codes[0].tobytes(),
+        f"{prefix}_dtype": dtype,
+        f"{prefix}_scale": float(scales[0]),
+    }
+
+def vector_field_paths(prefix="vector"):
+    return [prefix, f"{prefix}_f32", f"{prefix}_q", f"{prefix}_dtype", f"{prefix}_scale"]
+
+def quantized_from_doc(data, prefix="vector"):
+    # Nicemlenmiş baytların kopyasız görünümü: (kodlar, ölçek, dtype). Eski formatlarda None döner.
+    if data.get(f"{prefix}_q") is None:
+        return None
+    dtype = data.get(f"{prefix}_dtype", "float32")
+    return np.frombuffer(data[f"{prefix}_q"], dtype=np.dtype(dtype)), float(data.get(f"{prefix}_scale", 1.0)), dtype
+
+def vector_from_doc(data, prefix="vector"):
+    # Sırasıyla: nicemlenmiş bayt (<prefix>_q), float32 bayt (<prefix>_f32), eski float listesi (<prefix>).
+    quantized = quantized_from_doc(data, prefix)
+    if quantized is not None:
+        codes, scale, _ = quantized
+        return codes.astype(np.float32) * scale
+    if data.get(f"{prefix}_f32") is not None:
+        return np.frombuffer(data[f"{prefix}_f32"], dtype=np.float32)
+    if data.get(prefix) is not None:
+        return np.asarray(data[prefix], dtype=np.float32)
+    return None
+
+JOB_INDEX_FIELDS = ["title", "description", "content_hash", "added_by", "created_at"]
 
-@st.cache_data(ttl=300) 
 def get_job_postings_with_vectors():
-    jobs = []
+    # Puanlama ve sözcüksel indeks için gereken alanlar çekilir. Açıklamalar sadece BM25
+    # indeksine token olarak girer, metnin kendisi bellekte tutulmaz; aday kartları için
+    # açıklama seçimden sonra fetch_job_descriptions ile yüklenir.
+    # Üreteç olarak çalışır, böylece tüm koleksiyon aynı anda bellekte tutulmaz.
     try:
-        docs = db.collection("job_postings").stream()
+        docs = db.collection("job_postings").select(JOB_INDEX_FIELDS + vector_field_paths("vector")).stream()
         for doc in docs:
             job_data = doc.to_dict()
-            if 'vector' in job_data: 
-                jobs.append({
+            # Nicemlenmiş belgeler float32'ye açılmaz; kodlar indekse doğrudan kopyalanır.
+            quantized = quantized_from_doc(job_data)
+            vector = None if quantized is not None else vector_from_doc(job_data)
+            if quantized is not None or vector is not None:
+                yield {
                     "id": doc.id,
                     "title": job_data.get("title", "No Title"),
-                    "description": job_data.get("description", "No Description"),
-                    "vector": job_data.get("vector")
-                })
-        return jobs
+                    "description": job_data.get("description", ""),
+                    "content_hash": job_data.get("content_hash"),
+                    "added_by": job_data.get("added_by"),
+                    "created_at": job_data.get("created_at"),
+                    "vector": vector,
+                    "quantized": quantized
+                }
     except Exception as e:
+        # Hata yutulmaz: get_job_index önbelleğe boş/yarım indeks yazmasın, sonraki çağrıda yeniden denensin.
         st.error(f"İş ilanları çekilirken hata oluştu: {e}")
-        return []
+        raise
+
+def fetch_job_descriptions(job_ids):
+    refs = [db.collection("job_postings").document(job_id) for job_id in job_ids]
+    descriptions = {}
+    for doc in db.get_all(refs, field_paths=["description"]):
+        if doc.exists:
+            descriptions[doc.id] = doc.to_dict().get("description", "No Description")
+    return descriptions
+
+# --- VEKTÖR İNDEKSİ ---
+EMBEDDING_DIM = 768
+
+class VectorView:
+    # Nicemlenmiş matrisin salt-okunur görünümü. Puanlama parça parça float32'ye açılarak
+    # yapılır, böylece matrisin tamamı hiçbir zaman float32 kopya olarak bellekte durmaz.
+    def __init__(self, codes, scales):
+        self.codes = codes
+        self.scales = scales
+
+    def __len__(self):
+        return len(self.codes)
+
+    def rows(self, indices):
+        return self.codes[indices].astype(np.float32) * self.scales[indices, None]
+
+    def chunks(self, chunk_rows=SCORING_CHUNK_ROWS):
+        for start in range(0, len(self), chunk_rows):
+            end = min(start + chunk_rows, len(self))
+            yield start, self.codes[start:end].astype(np.float32, copy=False) * self.scales[start:end, None]
+
+    def score(self, query, indices=None):
+        if indices is not None:
+            # Seçili satırlar da parça parça açılır; geniş bir seçim tam float32 kopya oluşturmaz.
+            indices = np.asarray(indices)
+            scores = np.empty(len(indices), dtype=np.float32)
+            for start in range(0, len(indices), SCORING_CHUNK_ROWS):
+                chunk = indices[start:start + SCORING_CHUNK_ROWS]
+                scores[start:start + len(chunk)] = (self.codes[chunk].astype(np.float32) @ query) * self.scales[chunk]
+            return scores
+        scores = np.empty(len(self), dtype=np.float32)
+        for start in range(0, len(self), SCORING_CHUNK_ROWS):
+            end = min(start + SCORING_CHUNK_ROWS, len(self))
+            scores[start:end] = (self.codes[start:end].astype(np.float32, copy=False) @ query) * self.scales[start:end]
+        return scores
+
+class VectorIndex:
+    # Tüm oturumların paylaştığı, bitişik nicemlenmiş matris + id/başlık dizileri.
+    # Yeni kayıtlar sona eklenir; kapasite doldukça iki katına çıkar.
+    def __init__(self, dim=EMBEDDING_DIM, dtype=VECTOR_STORAGE_DTYPE):
+        self.dim = dim
+        self.dtype = dtype
+        self._lock = threading.Lock()
+        self._size = 0
+        self._codes = np.empty((0, dim), dtype=dtype)
+        self._scales = np.empty(0, dtype=np.float32)
+        self._ids = np.empty(0, dtype=object)
+        self._titles = np.empty(0, dtype=object)
+        self._positions = {}
+        self.content_hashes = set()
+
+    def __len__(self):
+        return self._size
+
+    def _grow(self, needed):
+        capacity = max(needed, 2 * len(self._codes), 1024)
+        codes = np.empty((capacity, self.dim), dtype=self.dtype)
+        codes[:self._size] = self._codes[:self._size]
+        self._codes = codes
+        scales = np.empty(capacity, dtype=np.float32)
+        scales[:self._size] = self._scales[:self._size]
+        self._scales = scales
+        for name in ("_ids", "_titles"):
+            grown = np.empty(capacity, dtype=object)
+            grown[:self._size] = getattr(self, name)[:self._size]
+            setattr(self, name, grown)
+
+    def add_many(self, ids, titles, vectors, content_hashes=(), scales=None):
+        # Var olan id'ler yerinde güncellenir (ör. yeniden kaydedilen CV), yeniler sona eklenir.
+        # content_hashes toplu yüklemede tekrar eden ilanları ayıklamak için tutulur.
+        # scales verilirse vectors indeksin dtype'ında önceden nicemlenmiş kodlardır, tekrar nicemlenmez.
+        if len(ids) == 0:
+            return
+        if scales is None:
+            codes, scales = quantize_vectors(np.reshape(vectors, (len(ids), self.dim)), self.dtype)
+        else:
+            codes = np.reshape(np.asarray(vectors, dtype=self.dtype), (len(ids), self.dim))
+            scales = np.asarray(scales, dtype=np.float32)
+        with self._lock:
+            fresh = []
+            for i, doc_id in enumerate(ids):
+                row = self._positions.get(doc_id)
+                if row is None:
+                    fresh.append(i)
+                else:
+                    self._codes[row] = codes[i]
+                    self._scales[row] = scales[i]
+                    self._titles[row] = titles[i]
+            start = self._size
+            end = start + len(fresh)
+            if end > len(self._codes):
+                self._grow(end)
+            self._codes[start:end] = codes[fresh]
+            self._scales[start:end] = scales[fresh]
+            self._ids[start:end] = [ids[i] for i in fresh]
+            self._titles[start:end] = [titles[i] for i in fresh]
+            for row, i in enumerate(fresh, start):
+                self._positions[ids[i]] = row
+            self._size = end
+            self.content_hashes.update(hash_ for hash_ in content_hashes if hash_)
+
+    def add(self, doc_id, title, vector, content_hash=None):
+        self.add_many([doc_id], [title], [vector], content_hashes=[content_hash])
+
+    def position(self, doc_id):
+        return self._positions.get(doc_id)
+
+    def get_vector(self, doc_id):
+        with self._lock:
+            row = self._positions.get(doc_id)
+            if row is None:
+                return None
+            return self._codes[row].astype(np.float32) * self._scales[row]
+
+    def snapshot(self):
+        # Sadece [:n] görünümleri döner; sonradan eklenen satırlar bu görünümleri değiştirmez.
+        with self._lock:
+            n = self._size
+            return VectorView(self._codes[:n], self._scales[:n]), self._ids[:n], self._titles[:n]
+
+INDEX_LOAD_CHUNK = 10000
+
+def add_records_to_index(index, records):
+    # Kodları indeksle aynı dtype'ta olan kayıtlar doğrudan kopyalanır; diğerleri (eski formatlar,
+    # farklı dtype) float32 üzerinden yeniden nicemlenir.
+    direct, converted = [], []
+    for record in records:
+        quantized = record.get("quantized")
+        if quantized is not None and quantized[2] == index.dtype:
+            direct.append(record)
+        else:
+            if quantized is not None:
+                record = {**record, "vector": quantized[0].astype(np.float32) * quantized[1]}
+            converted.append(record)
+    if direct:
+        index.add_many(
+            [record["id"] for record in direct],
+            [record["title"] for record in direct],
+            np.stack([record["quantized"][0] for record in direct]),
+            content_hashes=[record.get("content_hash") for record in direct],
+            scales=[record["quantized"][1] for record in direct],
+        )
+    if converted:
+        index.add_many(
+            [record["id"] for record in converted],
+            [record["title"] for record in converted],
+            [record["vector"] for record in converted],
+            content_hashes=[record.get("content_hash") for record in converted],
+        )
+
+@st.cache_resource
+def get_job_index():
+    # Firestore sadece süreç başlangıcında bir kez taranır; sonrası artımlı güncellenir.
+    # Aynı tarama BM25 indeksini de doldurur (bkz. get_job_text_index).
+    index = VectorIndex()
+    text_index = get_job_text_index()
+    jobs = []
+    with trace_stage("job_index_load") as span:
+        try:
+            for job in get_job_postings_with_vectors():
+                jobs.append(job)
+                if len(jobs) == INDEX_LOAD_CHUNK:
+                    add_records_to_index(index, jobs)
+                    add_records_to_text_index(text_index, index, jobs)
+                    jobs = []
+        except Exception:
+            # Yarım dolan BM25 indeksi de atılır; bir sonraki çağrı ikisini birlikte baştan yükler.
+            get_job_text_index.clear()
+            raise
+        add_records_to_index(index, jobs)
+        add_records_to_text_index(text_index, index, jobs)
+        span["rows"] = len(index)
+    return index
+
+# --- YAKLAŞIK EN YAKIN KOMŞU (IVF) ---
+IVF_MIN_SIZE = 2000        # Bunun altında IVF kurmaya değmez, kaba kuvvet zaten hızlı
+IVF_DEFAULT_NPROBE = 8
+IVF_KMEANS_ITERATIONS = 10
+IVF_TRAINING_SAMPLE = 50000
+IVF_REBUILD_RATIO = 0.2    # İndeksten sonra eklenen satırlar bu oranı geçerse yeniden kurulur
+SEARCH_BACKENDS = ["Exact (brute force)", "IVF (approximate)"]
+
+def top_k_from_scores(scores, k):
+    k = min(k, len(scores))
+    if k == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    top = np.argpartition(scores, len(scores) - k)[-k:]
+    top = top[np.argsort(scores[top])[::-1]]
+    return top, scores[top]
+
+def exact_top_k(vectors, query, k):
+    return top_k_from_scores(vectors.score(query), k)
+
+def _assign_to_centroids(vectors, centroids, chunk_size=16384):
+    assignments = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), chunk_size):
+        chunk = vectors[start:start + chunk_size]
+        assignments[start:start + chunk_size] = np.argmax(chunk @ centroids.T, axis=1)
+    return assignments
+
+class IVFIndex:
+    # Küresel k-means ile kümelenmiş ters dosya indeksi. Sorguda sadece en yakın
+    # `nprobe` kümenin satırları puanlanır; kurulumdan sonra VectorIndex'e eklenen
+    # satırlar (kuyruk) her sorguda tam olarak taranır.
+    def __init__(self, vectors, seed=0):
+        n = len(vectors)
+        n_lists = int(np.clip(np.sqrt(n), 1, 4096))
+        rng = np.random.default_rng(seed)
+        sample = vectors.rows(np.sort(rng.choice(n, size=min(n, IVF_TRAINING_SAMPLE), replace=False)))
+        centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)].copy()
+        for _ in range(IVF_KMEANS_ITERATIONS):
+            labels = _assign_to_centroids(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            filled = norms[:, 0] > 0
+            centroids[filled] = sums[filled] / norms[filled]
+        assignments = np.empty(n, dtype=np.int32)
+        for start, chunk in vectors.chunks():
+            assignments[start:start + len(chunk)] = _assign_to_centroids(chunk, centroids)
+        self.centroids = centroids
+        self.order = np.argsort(assignments, kind="stable")
+        self.offsets = np.concatenate(([0], np.cumsum(np.bincount(assignments, minlength=n_lists))))
+        self.n_indexed = n
+
+    @property
+    def n_lists(self):
+        return len(self.centroids)
+
+    def search(self, vectors, query, k, nprobe=IVF_DEFAULT_NPROBE):
+        nprobe = min(nprobe, self.n_lists)
+        centroid_scores = self.centroids @ query
+        probes = np.argpartition(centroid_scores, self.n_lists - nprobe)[-nprobe:]
+        rows = [self.order[self.offsets[c]:self.offsets[c + 1]] for c in probes]
+        rows.append(np.arange(self.n_indexed, len(vectors)))
+        rows = np.concatenate(rows)
+        if len(vectors) < self.n_indexed:
+            # Çağıranın görüntüsü bu IVF'den eski (arada yeniden kurulmuş): görüntüde olmayan satırlar atılır.
+            rows = rows[rows < len(vectors)]
+        local_top, scores = top_k_from_scores(vectors.score(query, rows), k)
+        return rows[local_top], scores
+
+class ANNSearcher:
+    # Bir VectorIndex üzerinde arka planda kurulan IVF katmanı; küçük indekslerde kaba kuvvete düşer.
+    # Kurulum hiçbir isteği bekletmez: ilk IVF hazır olana kadar kaba kuvvet, yeniden kurulum
+    # sürerken eski IVF + taranmamış kuyruk kullanılır, yenisi hazır olunca yer değiştirir.
+    def __init__(self, index):
+        self.index = index
+        self._lock = threading.Lock()
+        self._ivf = None
+        self._build_thread = None
+
+    @staticmethod
+    def _needs_build(n, ivf):
+        return ivf is None or n - ivf.n_indexed > IVF_REBUILD_RATIO * ivf.n_indexed
+
+    def _build(self, vectors):
+        try:
+            ivf = IVFIndex(vectors)
+            with self._lock:
+                if self._ivf is None or ivf.n_indexed > self._ivf.n_indexed:
+                    self._ivf = ivf
+        except Exception as e:
+            print(f"IVF indeksi kurulamadı: {e}")
+        finally:
+            with self._lock:
+                self._build_thread = None
+
+    def _current_ivf(self, vectors, wait=False):
+        # Gerekirse arka plan kurulumunu başlatır ve o an hazır olan IVF'yi (veya None) döner.
+        # wait=True sadece ölçüm içindir: bu görüntüyü kapsayan IVF hazır olana kadar bekler.
+        while True:
+            with self._lock:
+                ivf = self._ivf
+                if not self._needs_build(len(vectors), ivf):
+                    return ivf
+                if self._build_thread is None:
+                    self._build_thread = threading.Thread(target=self._build, args=(vectors,), name="ivf-build", daemon=True)
+                    self._build_thread.start()
+                thread = self._build_thread
+            if not wait:
+                return ivf
+            thread.join()
+
+    def wait_for_ivf(self, vectors):
+        return self._current_ivf(vectors, wait=True)
+
+    def search(self, vectors, query, k, backend=SEARCH_BACKENDS[0], nprobe=IVF_DEFAULT_NPROBE):
+        if backend == SEARCH_BACKENDS[0] or len(vectors) < IVF_MIN_SIZE:
+            return exact_top_k(vectors, query, k)
+        ivf = self._current_ivf(vectors)
+        if ivf is None:
+            return exact_top_k(vectors, query, k)
+        return ivf.search(vectors, query, k, nprobe)
+
+    def measure_recall(self, vectors, k=10, nprobe=IVF_DEFAULT_NPROBE, n_queries=50, seed=0):
+        # İlan vektörlerinin gürültülü kopyalarını sorgu olarak kullanıp IVF sonucunu
+        # kaba kuvvet sonucuyla karşılaştırır: (recall@k, exact ms, ivf ms)
+        rng = np.random.default_rng(seed)
+        queries = vectors.rows(rng.choice(len(vectors), size=min(n_queries, len(vectors)), replace=False))
+        queries = queries + rng.normal(scale=0.02, size=queries.shape).astype(np.float32)
+        ivf = self.wait_for_ivf(vectors)
+        hits, exact_time, ivf_time = 0, 0.0, 0.0
+        for query in queries:
+            t0 = time.perf_counter()
+            expected, _ = exact_top_k(vectors, query, k)
+            t1 = time.perf_counter()
+            found, _ = ivf.search(vectors, query, k, nprobe)
+            t2 = time.perf_counter()
+            hits += len(np.intersect1d(expected, found))
+            exact_time += t1 - t0
+            ivf_time += t2 - t1
+        n = len(queries)
+        return hits / (n * min(k, len(vectors))), 1000 * exact_time / n, 1000 * ivf_time / n
+
+@st.cache_resource
+def get_job_searcher():
+    return ANNSearcher(get_job_index())
+
+# --- SÖZCÜKSEL İNDEKS (BM25) VE HİBRİT ARAMA ---
+BM25_K1 = 1.2
+BM25_B = 0.75
+BM25_MAX_QUERY_TERMS = 64      # Uzun CV sorgularında sadece en ayırt edici terimler kullanılır
+BM25_MAX_DF_RATIO = 0.5        # İlanların yarısından fazlasında geçen terimler puana katılmaz
+HYBRID_FUSION_POOL = 200       # Füzyona her iki sıralamadan girecek aday sayısı
+HYBRID_RRF_K = 60
+HYBRID_LEXICAL_WEIGHT = 0.5
+# Hibrit arama zorunlu anahtar kelimeleri de yakaladığından Gemini'ye daha az aday gider;
+# havuz kalitesi "python -m benchmarks.run_benchmarks --only quality" ile ölçülür.
+VECTOR_CANDIDATE_POOL_SIZE = 10
+HYBRID_CANDIDATE_POOL_SIZE = 7
+RETRIEVAL_MODES = ["Hybrid (keywords + vectors)", "Vectors only"]
+TOKEN_PATTERN = re.compile(r"[^\W_][\w+#]*(?:\.[\w+#]+)*")   # c++, c#, node.js tek token kalır
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in into is it its of on or our that the their this "
+    "to we will with you your".split()
+)
+
+def tokenize(text):
+    # "İ".casefold() birleşik nokta (U+0307) bırakır; silinmezse "İstanbul" ikiye bölünür.
+    # "ı" da "i"ye katlanır, çünkü "I" harfinin küçüğü dile göre ikisinden biri olabilir.
+    text = unicodedata.normalize("NFC", text or "").casefold().replace("\u0307", "").replace("ı", "i")
+    return [token for token in TOKEN_PATTERN.findall(text) if token not in STOPWORDS]
+
+def timestamp_of(value):
+    if value is None:
+        return float("nan")
+    if hasattr(value, "timestamp"):
+        return value.timestamp()
+    return float(value)
+
+class LexicalIndex:
+    # VectorIndex satır numaralarıyla hizalı BM25 ters indeksi ve filtre meta verisi.
+    # Terim başına kompakt diziler (satır, terim frekansı, satır sürümü) tutulur; metnin kendisi
+    # saklanmaz. Yeniden eklenen satırın sürümü artar, eski kayıtları sorguda elenir.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings = {}
+        self._lengths = array("I")
+        self._versions = array("I")
+        self._created_at = array("d")
+        self._source_codes = array("I")
+        self._sources = {None: 0}
+
+    def __len__(self):
+        return len(self._lengths)
+
+    def add_many(self, rows, texts, added_by=(), created_at=()):
+        added_by = list(added_by) or [None] * len(rows)
+        created_at = list(created_at) or [None] * len(rows)
+        # Tokenlama kilit dışında yapılır; aramalar yükleme sırasında beklemez.
+        term_counts = [Counter(tokenize(text)) for text in texts]
+        with self._lock:
+            for row, counts, source, created in zip(rows, term_counts, added_by, created_at):
+                while len(self._lengths) <= row:
+                    for column in (self._lengths, self._versions, self._source_codes):
+                        column.append(0)
+                    self._created_at.append(float("nan"))
+                version = self._versions[row] + 1
+                self._versions[row] = version
+                self._lengths[row] = sum(counts.values())
+                self._created_at[row] = timestamp_of(created)
+                self._source_codes[row] = self._sources.setdefault(source, len(self._sources))
+                for term, tf in counts.items():
+                    postings = self._postings.get(term)
+                    if postings is None:
+                        postings = self._postings[term] = (array("i"), array("H"), array("I"))
+                    postings[0].append(row)
+                    postings[1].append(min(tf, 65535))
+                    postings[2].append(version)
+
+    def _live_postings(self, term, versions):
+        # Kilit tutulurken çağrılır: diziler kopyalanır, sonraki eklemeler onları değiştirebilir.
+        postings = self._postings.get(term)
+        if postings is None:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        rows = np.array(postings[0], dtype=np.int64)
+        tfs = np.array(postings[1], dtype=np.float32)
+        keep = rows < len(versions)
+        keep[keep] = np.array(postings[2], dtype=np.uint32)[keep] == versions[rows[keep]]
+        return rows[keep], tfs[keep]
+
+    def score(self, query_text, n_rows):
+        # İlk n_rows satır (bir VectorIndex anlık görüntüsü) için yoğun BM25 skor dizisi döner.
+        scores = np.zeros(n_rows, dtype=np.float32)
+        query_counts = Counter(tokenize(query_text))
+        with self._lock:
+            n_docs = min(n_rows, len(self._lengths))
+            if n_docs == 0 or not query_counts:
+                return scores
+            versions = np.array(self._versions[:n_docs], dtype=np.uint32)
+            lengths = np.array(self._lengths[:n_docs], dtype=np.float32)
+            term_postings = [(term, qtf, *self._live_postings(term, versions)) for term, qtf in query_counts.items()]
+        avg_length = max(float(lengths.mean()), 1.0)
+        weighted = []
+        for term, qtf, rows, tfs in term_postings:
+            df = len(rows)
+            if df == 0 or df > BM25_MAX_DF_RATIO * n_docs:
+                continue
+            idf = np.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            weighted.append((idf * (1 + np.log(qtf)), rows, tfs))
+        weighted.sort(key=lambda item: item[0], reverse=True)
+        for weight, rows, tfs in weighted[:BM25_MAX_QUERY_TERMS]:
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[rows] / avg_length)
+            scores[rows] += weight * tfs * (BM25_K1 + 1) / (tfs + norm)
+        return scores
+
+    def filter_mask(self, n_rows, required_terms=(), added_by=(), created_after=None):
+        # Filtre yoksa None, varsa ilk n_rows satır için bool maske döner.
+        # required_terms: her ifadenin tüm token'ları ilanda geçmeli; added_by: kabul edilen kaynaklar.
+        required = [token for phrase in required_terms for token in tokenize(phrase)]
+        if not required and not added_by and created_after is None:
+            return None
+        mask = np.zeros(n_rows, dtype=bool)
+        with self._lock:
+            n_docs = min(n_rows, len(self._lengths))
+            mask[:n_docs] = True
+            versions = np.array(self._versions[:n_docs], dtype=np.uint32)
+            for token in required:
+                term_mask = np.zeros(n_rows, dtype=bool)
+                term_mask[self._live_postings(token, versions)[0]] = True
+                mask &= term_mask
+            if added_by:
+                codes = [self._sources[source] for source in added_by if source in self._sources]
+                mask[:n_docs] &= np.isin(np.array(self._source_codes[:n_docs], dtype=np.uint32), codes)
+            if created_after is not None:
+                mask[:n_docs] &= np.array(self._created_at[:n_docs]) >= created_after
+        return mask
+
+@st.cache_resource
+def get_job_text_index():
+    # get_job_index ilk yüklemede doldurur; sonrasında ilan eklenen her yerde birlikte güncellenir.
+    return LexicalIndex()
+
+def add_records_to_text_index(text_index, index, records):
+    text_index.add_many(
+        [index.position(record["id"]) for record in records],
+        [f"{record['title']}\n{record.get('description', '')}" for record in records],
+        added_by=[record.get("added_by") for record in records],
+        created_at=[record.get("created_at") for record in records],
+    )
+
+def hybrid_search(vectors, query_vector, query_text, k, backend=SEARCH_BACKENDS[0], nprobe=IVF_DEFAULT_NPROBE,
+                  lexical_weight=HYBRID_LEXICAL_WEIGHT, filters=None, vector_rows=None):
+    # Vektör ve BM25 sıralamaları ağırlıklı Reciprocal Rank Fusion ile birleştirilir:
+    # skor = (1 - w) / (K + vektör sırası) + w / (K + BM25 sırası). Skor ölçekleri farklı
+    # olduğundan sıralar kullanılır. Filtre varsa iki taraf da maskeye uyan satırlarla sınırlanır.
+    # vector_rows verilirse (ör. önceden hesaplanmış adaylar) vektör araması atlanır.
+    n = len(vectors)
+    text_index = get_job_text_index()
+    mask = text_index.filter_mask(n, **(filters or {}))
+    if mask is not None:
+        # Tüm matris parça parça puanlanır, maske dışı satırlar -inf ile elenir; bellek filtre
+        # genişliğinden bağımsız kalır.
+        vector_scores = vectors.score(query_vector)
+        vector_scores[~mask] = -np.inf
+        vector_rows, top_scores = top_k_from_scores(vector_scores, HYBRID_FUSION_POOL)
+        vector_rows = vector_rows[np.isfinite(top_scores)]
+    elif vector_rows is None:
+        vector_rows, _ = get_job_searcher().search(vectors, query_vector, HYBRID_FUSION_POOL, backend=backend, nprobe=nprobe)
+    fused = {}
+    for rank, row in enumerate(vector_rows[:HYBRID_FUSION_POOL]):
+        fused[int(row)] = (1 - lexical_weight) / (HYBRID_RRF_K + rank + 1)
+    if lexical_weight > 0:
+        with trace_stage("lexical_search", rows=n):
+            lexical_scores = text_index.score(query_text, n)
+            if mask is not None:
+                lexical_scores[~mask] = 0
+            lexical_rows, lexical_top = top_k_from_scores(lexical_scores, HYBRID_FUSION_POOL)
+        for rank, row in enumerate(lexical_rows[lexical_top > 0]):
+            fused[int(row)] = fused.get(int(row), 0.0) + lexical_weight / (HYBRID_RRF_K + rank + 1)
+    rows = np.fromiter(fused.keys(), dtype=np.int64, count=len(fused))
+    top, scores = top_k_from_scores(np.fromiter(fused.values(), dtype=np.float32, count=len(fused)), k)
+    return rows[top], scores
+
+# --- PROFİL (CV) İNDEKSİ ---
+def get_profiles_with_vectors():
+    try:
+        docs = db.collection("user_profiles").select(["email"] + vector_field_paths("cv_vector")).stream()
+        for doc in docs:
+            profile_data = doc.to_dict()
+            quantized = quantized_from_doc(profile_data, "cv_vector")
+            vector = None if quantized is not None else vector_from_doc(profile_data, "cv_vector")
+            if quantized is not None or vector is not None:
+                yield {
+                    "id": doc.id,
+                    "title": profile_data.get("email", "Unknown"),
+                    "vector": vector,
+                    "quantized": quantized
+                }
+    except Exception as e:
+        st.error(f"Profiller çekilirken hata oluştu: {e}")
+        raise
+
+@st.cache_resource
+def get_profile_index():
+    # İş indeksiyle aynı yapı: başlık olarak e-posta tutulur, profil kaydında yerinde güncellenir.
+    index = VectorIndex()
+    profiles = []
+    for profile in get_profiles_with_vectors():
+        profiles.append(profile)
+        if len(profiles) == INDEX_LOAD_CHUNK:
+            add_records_to_index(index, profiles)
+            profiles = []
+    add_records_to_index(index, profiles)
+    return index
+
+@st.cache_resource
+def get_profile_searcher():
+    return ANNSearcher(get_profile_index())
+
+def fetch_profile_cvs(user_ids):
+    refs = [db.collection("user_profiles").document(user_id) for user_id in user_ids]
+    cvs = {}
+    for doc in db.get_all(refs, field_paths=["cv_text"]):
+        if doc.exists:
+            cvs[doc.id] = doc.to_dict().get("cv_text", "")
+    return cvs
+
+# --- ÖNCEDEN HESAPLANMIŞ EŞLEŞME MATRİSİ ---
+PRECOMPUTED_TOP_K = 50
+PRECOMPUTE_PROFILE_BLOCK = 256
+
+class MatchPrecomputer:
+    # Her kayıtlı profil için en iyi K ilanı (iş indeksindeki satır numarası + skor) arka plan
+    # thread'inde güncel tutar. Yeni ilanlar tüm CV'lere karşı tek matris çarpımıyla puanlanır;
+    # kaydedilen bir profil ise sadece kendi satırı için baştan puanlanır.
+    def __init__(self, job_index, profile_index, k=PRECOMPUTED_TOP_K):
+        self.job_index = job_index
+        self.profile_index = profile_index
+        self.k = k
+        self._lock = threading.Lock()
+        self._events = queue.Queue()
+        self._top_rows = np.full((0, k), -1, dtype=np.int64)
+        self._top_scores = np.full((0, k), -np.inf, dtype=np.float32)
+        self._ready = np.zeros(0, dtype=bool)
+        self._stale = set()            # Kaydedildi bildirimi gelmiş ama henüz baştan puanlanmamış satırlar
+        self._jobs_scored = 0
+        self._events.put(("jobs", None))
+        threading.Thread(target=self._worker_loop, name="match-precomputer", daemon=True).start()
+
+    def notify_jobs_added(self):
+        self._events.put(("jobs", None))
+
+    def notify_profile_saved(self, user_id):
+        # Satır hemen hazır değil sayılır: eski CV'nin listesi, yeni puanlama bitene kadar dönmemeli.
+        row = self.profile_index.position(user_id)
+        with self._lock:
+            if row is not None:
+                self._stale.add(row)
+                if row < len(self._ready):
+                    self._ready[row] = False
+        self._events.put(("profile", user_id))
+
+    def get_top_jobs(self, user_id, n_jobs=None):
+        # n_jobs: çağıranın iş indeksi görüntüsünün boyu. Arka plan o görüntüden sonra eklenen
+        # ilanları birleştirmiş olabilir; görüntüde olmayan satırlar döndürülmez.
+        row = self.profile_index.position(user_id)
+        with self._lock:
+            if row is None or row >= len(self._ready) or not self._ready[row]:
+                return None
+            rows, scores = self._top_rows[row], self._top_scores[row]
+            valid = rows >= 0
+            if n_jobs is not None:
+                valid &= rows < n_jobs
+            return rows[valid].copy(), scores[valid].copy()
+
+    def _worker_loop(self):
+        while True:
+            events = [self._events.get()]
+            while not self._events.empty():
+                events.append(self._events.get_nowait())
+            dirty_ids = {payload for kind, payload in events if kind == "profile"}
+            try:
+                self._sync(dirty_ids)
+            except Exception as e:
+                print(f"Eşleşme matrisi güncellenemedi: {e}")
+
+    def _sync(self, dirty_ids):
+        job_view, _, _ = self.job_index.snapshot()
+        profile_view, _, _ = self.profile_index.snapshot()
+        n_jobs, n_profiles = len(job_view), len(profile_view)
+        with self._lock:
+            known = len(self._ready)
+            if n_profiles > known:
+                grow = n_profiles - known
+                self._top_rows = np.vstack([self._top_rows, np.full((grow, self.k), -1, dtype=np.int64)])
+                self._top_scores = np.vstack([self._top_scores, np.full((grow, self.k), -np.inf, dtype=np.float32)])
+                self._ready = np.concatenate([self._ready, np.zeros(grow, dtype=bool)])
+            dirty = {self.profile_index.position(uid) for uid in dirty_ids} - {None}
+            dirty.update(range(known, n_profiles))
+            dirty_rows = np.array(sorted(dirty), dtype=np.int64)
+            # Puanlama parça parça birleştirildiğinden yarım liste okunmasın diye satırlar kapatılır.
+            self._ready[dirty_rows] = False
+            self._stale.difference_update(dirty)
+            self._top_rows[dirty_rows] = -1
+            self._top_scores[dirty_rows] = -np.inf
+        clean_rows = np.setdiff1d(np.arange(n_profiles), dirty_rows)
+
+        # Yeni/kaydedilen profiller tüm ilanlara, diğerleri sadece yeni ilanlara karşı puanlanır.
+        self._score_rows(profile_view, dirty_rows, job_view, 0, n_jobs)
+        self._score_rows(profile_view, clean_rows, job_view, self._jobs_scored, n_jobs)
+        with self._lock:
+            self._ready[:n_profiles] = True
+            # Bu tur sürerken tekrar kaydedilen profiller bir sonraki turu bekler.
+            self._ready[[row for row in self._stale if row < n_profiles]] = False
+        self._jobs_scored = n_jobs
+
+    def _score_rows(self, profile_view, profile_rows, job_view, job_start, job_end):
+        if len(profile_rows) == 0 or job_end <= job_start:
+            return
+        for block_start in range(0, len(profile_rows), PRECOMPUTE_PROFILE_BLOCK):
+            block = profile_rows[block_start:block_start + PRECOMPUTE_PROFILE_BLOCK]
+            cv_matrix = profile_view.rows(block)
+            for chunk_start in range(job_start, job_end, SCORING_CHUNK_ROWS):
+                chunk = slice(chunk_start, min(chunk_start + SCORING_CHUNK_ROWS, job_end))
+                scores = cv_matrix @ job_view.rows(chunk).T
+                self._merge(block, np.arange(chunk.start, chunk.stop), scores)
+
+    def _merge(self, block, job_rows, scores):
+        with self._lock:
+            combined_scores = np.concatenate([self._top_scores[block], scores], axis=1)
+            combined_rows = np.concatenate([self._top_rows[block], np.broadcast_to(job_rows, scores.shape)], axis=1)
+            keep = np.argpartition(-combined_scores, self.k - 1, axis=1)[:, :self.k]
+            top_scores = np.take_along_axis(combined_scores, keep, axis=1)
+            top_rows = np.take_along_axis(combined_rows, keep, axis=1)
+            order = np.argsort(-top_scores, axis=1)
+            self._top_scores[block] = np.take_along_axis(top_scores, order, axis=1)
+            self._top_rows[block] = np.take_along_axis(top_rows, order, axis=1)
+
+@st.cache_resource
+def get_match_precomputer():
+    return MatchPrecomputer(get_job_index(), get_profile_index())
+
+# --- ANALİZ ÖNBELLEĞİ ---
+ANALYSIS_PROMPT_VERSION = 2          # Prompt değiştiğinde artırın; eski sonuçlar kullanılmaz
+ANALYSIS_CACHE_PATH = os.path.join(".cache", "analyses.sqlite3")
+ANALYSIS_CACHE_TTL = 7 * 24 * 3600
+
+def text_hash(text):
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+class AnalysisCache:
+    # (CV hash, ilan id, prompt sürümü) anahtarlı kalıcı Gemini analiz önbelleği.
+    # İlan metninin hash'i de saklanır; ilan değişirse kayıt geçersiz sayılır.
+    def __init__(self, path=ANALYSIS_CACHE_PATH, ttl=ANALYSIS_CACHE_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS analyses ("
+            "cv_hash TEXT NOT NULL, job_id TEXT NOT NULL, prompt_version INTEGER NOT NULL, "
+            "job_hash TEXT NOT NULL, result TEXT NOT NULL, created_at REAL NOT NULL, "
+            "PRIMARY KEY (cv_hash, job_id, prompt_version))"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cv_summaries ("
+            "cv_hash TEXT NOT NULL, prompt_version INTEGER NOT NULL, summary TEXT NOT NULL, "
+            "PRIMARY KEY (cv_hash, prompt_version))"
+        )
+        self._conn.commit()
+
+    def get(self, cv_hash, job_id, job_hash):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result FROM analyses WHERE cv_hash = ? AND job_id = ? AND prompt_version = ? "
+                "AND job_hash = ? AND created_at > ?",
+                (cv_hash, job_id, ANALYSIS_PROMPT_VERSION, job_hash, time.time() - self.ttl),
+            ).fetchone()
+            self.stats["hits" if row else "misses"] += 1
+        return json.loads(row[0]) if row else None
+
+    def put(self, cv_hash, job_id, job_hash, result):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO analyses VALUES (?, ?, ?, ?, ?, ?)",
+                (cv_hash, job_id, ANALYSIS_PROMPT_VERSION, job_hash, json.dumps(result), time.time()),
+            )
+            self._conn.commit()
+
+    def get_cv_summary(self, cv_hash):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT summary FROM cv_summaries WHERE cv_hash = ? AND prompt_version = ?",
+                (cv_hash, ANALYSIS_PROMPT_VERSION),
+            ).fetchone()
+        return row[0] if row else None
+
+    def put_cv_summary(self, cv_hash, summary):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cv_summaries VALUES (?, ?, ?)",
+                (cv_hash, ANALYSIS_PROMPT_VERSION, summary),
+            )
+            self._conn.commit()
+
+    def invalidate_jobs(self, job_ids):
+        with self._lock:
+            self._conn.executemany("DELETE FROM analyses WHERE job_id = ?", [(job_id,) for job_id in job_ids])
+            self._conn.commit()
+
+@st.cache_resource
+def get_analysis_cache():
+    return AnalysisCache()
+
+# --- ANALİZ MOTORU ---
+ANALYSIS_CV_TOKEN_BUDGET = 1500
+ANALYSIS_JOB_TOKEN_BUDGET = 1000
+CHARS_PER_TOKEN = 4                  # Gemini tokenizer'ı için kaba tahmin; count_tokens ağ çağrısı gerektirir
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+def truncate_to_token_budget(text, budget):
+    limit = budget * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    cut = text.rfind(" ", 0, limit)
+    return text[:cut if cut > 0 else limit] + " [...]"
+
+class AnalysisUsageLog:
+    # Her Gemini çağrısı için giriş/çıkış token sayısı ve gecikme (son 1000 çağrı).
+    def __init__(self, maxlen=1000):
+        self._lock = threading.Lock()
+        self._calls = deque(maxlen=maxlen)
+
+    def record(self, kind, prompt_tokens, output_tokens, latency):
+        with self._lock:
+            self._calls.append((kind, prompt_tokens, output_tokens, latency))
+
+    def summary(self):
+        with self._lock:
+            calls = list(self._calls)
+        if not calls:
+            return None
+        _, prompt_tokens, output_tokens, latencies = zip(*calls)
+        return {
+            "calls": len(calls),
+            "avg_prompt_tokens": float(np.mean(prompt_tokens)),
+            "avg_output_tokens": float(np.mean(output_tokens)),
+            "latency_p50": float(np.percentile(latencies, 50)),
+            "latency_p95": float(np.percentile(latencies, 95)),
+        }
+
+@st.cache_resource
+def get_analysis_usage_log():
+    return AnalysisUsageLog()
+
+def generate_with_usage(kind, model, prompt):
+    start = time.perf_counter()
+    response = model.generate_content(prompt)
+    usage = getattr(response, "usage_metadata", None)
+    get_analysis_usage_log().record(
+        kind,
+        getattr(usage, "prompt_token_count", 0),
+        getattr(usage, "candidates_token_count", 0),
+        time.perf_counter() - start,
+    )
+    return response
+
+def summarize_cv(cv_text):
+    prompt = f"""
+    Compress the following CV into a dense plain-text profile of at most {ANALYSIS_CV_TOKEN_BUDGET // 2} words.
+    Keep every skill, technology, certification, job title, employer, duration and education entry.
+    Drop formatting, contact details and filler.
+
+    ---[CV TEXT]----
+    {cv_text}
+    -----------------
+    """
+    response = generate_with_usage("cv_summary", summary_model, prompt)
+    return response.text.strip()
+
+def prepare_cvs_for_analysis(cv_texts):
+    # Bütçeyi aşan CV'ler bir kez özetlenip önbelleğe yazılır; aynı özet tüm aday
+    # çağrılarında tekrar kullanılır. Özetleme başarısız olursa CV kırpılır.
+    cache = get_analysis_cache()
+    prepared = {}
+    futures = {}
+    for cv_text in set(cv_texts):
+        if estimate_tokens(cv_text) <= ANALYSIS_CV_TOKEN_BUDGET:
+            prepared[cv_text] = cv_text
+            continue
+        cv_hash = text_hash(cv_text)
+        summary = cache.get_cv_summary(cv_hash)
+        if summary:
+            prepared[cv_text] = summary
+        else:
+            futures[get_gemini_scheduler().submit(current_session_id(), "analysis", summarize_cv, cv_text)] = (cv_text, cv_hash)
+    for future in concurrent.futures.as_completed(futures):
+        cv_text, cv_hash = futures[future]
+        try:
+            summary = truncate_to_token_budget(future.result(), ANALYSIS_CV_TOKEN_BUDGET)
+            cache.put_cv_summary(cv_hash, summary)
+        except Exception as e:
+            print(f"CV özeti oluşturulamadı: {e}")
+            summary = truncate_to_token_budget(cv_text, ANALYSIS_CV_TOKEN_BUDGET)
+        prepared[cv_text] = summary
+    return prepared
 
 def get_gemini_analysis(cv, job_post):
+    job_post = truncate_to_token_budget(job_post, ANALYSIS_JOB_TOKEN_BUDGET)
     prompt = f"""
     You are a senior Human Resources (HR) specialist.
     Analyze the following CV and JOB POSTING.
     
-    Your response MUST be a valid JSON object with the following exact structure:
-    {{
-        "score": <number from 0-100>,
-        "pros": ["<strength 1>", "<strength 2>", "<strength 3>"],
-        "cons": ["<weakness 1>", "<weakness 2>", "<weakness 3>"],
-        "summary": "<A 2-3 sentence evaluation summary>"
-    }}
+    Return a score from 0-100, three strengths (pros), three weaknesses (cons)
+    and a 2-3 sentence evaluation summary.
 
     ---[CV TEXT]----
     {cv}
@@ -142,39 +1368,577 @@ def get_gemini_analysis(cv, job_post):
     {job_post}
     -----------------
     """
+    response = None
     try:
-        response = gemini_model.generate_content(prompt)
-        clean_json_text = re.sub(r"^```json\n", "", response.text)
-        clean_json_text = re.sub(r"\n```$", "", clean_json_text).strip()
-        analysis_data = json.loads(clean_json_text)
-        return analysis_data
+        with trace_stage("gemini_analysis"):
+            response = generate_with_usage("analysis", gemini_model, prompt)
+        return json.loads(response.text)
+    except RETRYABLE_ERRORS:
+        # Kota/sunucu hataları zamanlayıcının yeniden deneme mantığına bırakılır.
+        raise
     except Exception as e:
-        # Hata durumunda, AI'ın ne döndüğünü görmek için loglayabiliriz
-        print(f"JSON Parse Hatası: {e}")
-        print(f"AI Ham Yanıtı: {response.text}")
+        # Şema zorunlu olduğundan buraya sadece engellenen/boş yanıtlar düşer
+        print(f"Gemini analiz hatası: {e}")
+        if response is not None:
+            print(f"AI yanıtı: {getattr(response, 'prompt_feedback', None)}")
         return None 
 
-def get_embedding(text):
+# --- EMBEDDING ÖNBELLEĞİ ---
+EMBEDDING_MODEL = "models/text-embedding-004"
+EMBEDDING_CACHE_PATH = os.path.join(".cache", "embeddings.sqlite3")
+EMBEDDING_CACHE_MEMORY_SIZE = 10000
+
+def normalize_text(text):
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+def embedding_cache_key(text, model=EMBEDDING_MODEL, task_type="RETRIEVAL_DOCUMENT"):
+    payload = f"{model}\n{task_type}\n{normalize_text(text)}".encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()
+
+class EmbeddingCache:
+    # İki katmanlı içerik-adresli önbellek: sınırlı bellek içi LRU + kalıcı SQLite.
+    # Vektörler salt-okunur float32 dizileri olarak tutulur (768 boyutta ~3 KB; Python listesi ~24 KB).
+    def __init__(self, path=EMBEDDING_CACHE_PATH, memory_size=EMBEDDING_CACHE_MEMORY_SIZE):
+        self.memory_size = memory_size
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        self._conn.commit()
+
+    def _remember(self, key, vector):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        if len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return vector
+            row = self._conn.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+            vector = np.frombuffer(row[0], dtype=np.float32)
+            self._remember(key, vector)
+            self.stats["disk_hits"] += 1
+            return vector
+
+    def put(self, key, vector):
+        # Saklanan diziyi döner; çağıranlar API'nin listesi yerine onu kullanır.
+        return self.put_many([key], [vector])[0]
+
+    def put_many(self, keys, vectors):
+        # Bir API grubunun tamamı tek executemany ve tek commit ile yazılır; satır başına commit
+        # toplu yüklemede sürenin yarısını alıyordu. Dönüşüm kilit dışında yapılır.
+        stored = []
+        for vector in vectors:
+            vector = np.asarray(vector, dtype=np.float32)
+            vector.flags.writeable = False
+            stored.append(vector)
+        with self._lock:
+            for key, vector in zip(keys, stored):
+                self._remember(key, vector)
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [(key, vector.tobytes()) for key, vector in zip(keys, stored)]
+            )
+            self._conn.commit()
+        return stored
+
+@st.cache_resource
+def get_embedding_cache():
+    return EmbeddingCache()
+
+def get_embedding(text, task_type="RETRIEVAL_DOCUMENT"):
+    cache = get_embedding_cache()
+    key = embedding_cache_key(text, task_type=task_type)
+    with trace_stage("embedding", task_type=task_type) as span:
+        cached = cache.get(key)
+        span["cache_hit"] = cached is not None
+        if cached is not None:
+            return cached
+        try:
+            result = get_gemini_scheduler().submit(
+                current_session_id(), "embedding", embed_content,
+                model=EMBEDDING_MODEL,
+                content=text,
+                task_type=task_type
+            ).result()
+            return cache.put(key, result['embedding'])
+        except Exception as e:
+            span["error"] = str(e)
+            st.error(f"Metnin 'parmak izi' alınırken hata oluştu: {e}")
+            return None
+
+# --- TOPLU EMBEDDING HATTI ---
+EMBEDDING_BATCH_SIZE = 100          # embed_content tek istekte en fazla 100 metin kabul ediyor
+
+def _embed_batch(texts, task_type):
+    result = embed_content(model=EMBEDDING_MODEL, content=texts, task_type=task_type)
+    return result['embedding']
+
+def get_embeddings_batch(texts, task_type="RETRIEVAL_DOCUMENT", progress_callback=None):
+    # Önbellekte olmayan metinleri 100'lük gruplar halinde ortak zamanlayıcı üzerinden gömer.
+    # Dönen liste girdiyle hizalıdır; başarısız grupların elemanları None olur.
+    cache = get_embedding_cache()
+    keys = [embedding_cache_key(text, task_type=task_type) for text in texts]
+    vectors = [cache.get(key) for key in keys]
+    missing = [i for i, vector in enumerate(vectors) if vector is None]
+    batches = [missing[i:i + EMBEDDING_BATCH_SIZE] for i in range(0, len(missing), EMBEDDING_BATCH_SIZE)]
+
+    done = len(texts) - len(missing)
+    if progress_callback:
+        progress_callback(done, len(texts))
+    scheduler = get_gemini_scheduler()
+    session_id = current_session_id()
+    future_to_batch = {
+        scheduler.submit(session_id, "embedding", _embed_batch, [texts[i] for i in batch], task_type): batch
+        for batch in batches
+    }
+    for future in concurrent.futures.as_completed(future_to_batch):
+        batch = future_to_batch[future]
+        try:
+            for i, vector in zip(batch, cache.put_many([keys[i] for i in batch], future.result())):
+                vectors[i] = vector
+        except Exception as e:
+            print(f"Toplu embedding hatası ({len(batch)} metin): {e}")
+        done += len(batch)
+        if progress_callback:
+            progress_callback(done, len(texts))
+    return vectors
+
+# --- TOPLU FIRESTORE YAZICISI ---
+FIRESTORE_BATCH_LIMIT = 500          # Firestore'un tek batch'te izin verdiği işlem sayısı
+FIRESTORE_COMMIT_CONCURRENCY = 4
+FIRESTORE_COMMIT_RETRIES = 5
+BULK_WINDOW_SIZE = 2000              # Her pencere gömülür, yazılır ve sonra checkpoint alınır
+def _commit_with_retry(writes, merge=False):
+    for attempt in range(FIRESTORE_COMMIT_RETRIES):
+        batch = db.batch()
+        for doc_ref, data in writes:
+            batch.set(doc_ref, data, merge=merge)
+        try:
+            batch.commit()
+            return
+        except RETRYABLE_ERRORS:
+            if attempt == FIRESTORE_COMMIT_RETRIES - 1:
+                raise
+            time.sleep(backoff_delay(attempt))
+
+def commit_in_batches(writes, merge=False):
+    # Yazmaları 500'lük batch'lere böler ve paralel commit eder. Belge id'leri
+    # deterministik olduğu için yeniden denenen bir batch çift kayıt üretmez.
+    chunks = [writes[i:i + FIRESTORE_BATCH_LIMIT] for i in range(0, len(writes), FIRESTORE_BATCH_LIMIT)]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=FIRESTORE_COMMIT_CONCURRENCY) as executor:
+        for future in [executor.submit(_commit_with_retry, chunk, merge) for chunk in chunks]:
+            future.result()
+
+def migrate_vector_storage(collection, prefix, dtype=VECTOR_STORAGE_DTYPE, progress_callback=None):
+    # Eski float listesi / float32 bayt vektörleri <prefix>_q nicemlenmiş formata çevirir.
+    # Zaten hedef formatta olan belgeler atlanır; yarıda kalırsa tekrar çalıştırmak güvenlidir.
+    window = FIRESTORE_BATCH_LIMIT * FIRESTORE_COMMIT_CONCURRENCY
+    writes, migrated, scanned = [], 0, 0
+    for doc in db.collection(collection).select(vector_field_paths(prefix)).stream():
+        scanned += 1
+        data = doc.to_dict()
+        if data.get(f"{prefix}_dtype") == dtype and data.get(prefix) is None and data.get(f"{prefix}_f32") is None:
+            continue
+        vector = vector_from_doc(data, prefix)
+        if vector is None:
+            continue
+        writes.append((doc.reference, {
+            **encode_vector_fields(vector, prefix, dtype),
+            prefix: firestore.DELETE_FIELD,
+            f"{prefix}_f32": firestore.DELETE_FIELD,
+        }))
+        if len(writes) == window:
+            commit_in_batches(writes, merge=True)
+            migrated += len(writes)
+            writes = []
+            if progress_callback:
+                progress_callback(scanned, migrated)
+    commit_in_batches(writes, merge=True)
+    migrated += len(writes)
+    if progress_callback:
+        progress_callback(scanned, migrated)
+    return scanned, migrated
+
+def bulk_upload_id(file_obj):
+    digest = hashlib.sha256()
+    file_obj.seek(0)
+    for block in iter(lambda: file_obj.read(UPLOAD_COPY_CHUNK), b""):
+        digest.update(block)
+    file_obj.seek(0)
+    return digest.hexdigest()
+
+def get_bulk_checkpoint(upload_id):
+    doc = db.collection("bulk_upload_checkpoints").document(upload_id).get()
+    return doc.to_dict().get("next_row", 0) if doc.exists else 0
+
+def job_content_hash(title, description):
+    return text_hash(f"{title}\n{description}")
+
+# --- AKAN TABLO OKUYUCU (CSV/XLSX) ---
+# Dosya hiçbir zaman tek DataFrame olarak okunmaz: CSV pandas chunksize ile,
+# XLSX openpyxl read-only modunda satır satır okunur. Bellek bir pencereyle sınırlıdır.
+REQUIRED_COLUMNS = ("title", "description")
+
+def _open_xlsx_rows(file_obj):
+    file_obj.seek(0)
+    workbook = openpyxl.load_workbook(file_obj, read_only=True, data_only=True)
+    return workbook, workbook.active.iter_rows(values_only=True)
+
+def read_spreadsheet_header(file_obj, is_csv):
+    if is_csv:
+        file_obj.seek(0)
+        return [str(column) for column in pd.read_csv(file_obj, nrows=0).columns]
+    workbook, rows = _open_xlsx_rows(file_obj)
     try:
-        result = genai.embed_content(
-            model="models/text-embedding-004",
-            content=text,
-            task_type="RETRIEVAL_DOCUMENT"
-        )
-        return result['embedding']
-    except Exception as e:
-        st.error(f"Metnin 'parmak izi' alınırken hata oluştu: {e}")
-        return None
+        return [str(column) for column in next(rows, ())]
+    finally:
+        workbook.close()
 
-def get_user_cv(user_id):
+def iter_spreadsheet_rows(file_obj, is_csv, chunk_rows=BULK_WINDOW_SIZE):
+    # (satır no, başlık, açıklama) üretir; satır no başlık satırı hariç 0'dan başlar.
+    if is_csv:
+        file_obj.seek(0)
+        row_number = 0
+        for chunk in pd.read_csv(file_obj, usecols=list(REQUIRED_COLUMNS), dtype=str, keep_default_na=False, chunksize=chunk_rows):
+            for title, description in zip(chunk["title"], chunk["description"]):
+                yield row_number, title, description
+                row_number += 1
+        return
+    workbook, rows = _open_xlsx_rows(file_obj)
     try:
-        doc_ref = db.collection("user_profiles").document(user_id).get()
-        if doc_ref.exists:
-            return doc_ref.to_dict().get("cv_text", "")
-        return ""
+        header = [str(column) for column in next(rows, ())]
+        title_col, description_col = header.index("title"), header.index("description")
+        for row_number, row in enumerate(rows):
+            yield row_number, "" if row[title_col] is None else str(row[title_col]), "" if row[description_col] is None else str(row[description_col])
+    finally:
+        workbook.close()
+
+def count_spreadsheet_rows(file_obj, is_csv):
+    if is_csv:
+        file_obj.seek(0)
+        return sum(len(chunk) for chunk in pd.read_csv(file_obj, usecols=["title"], dtype=str, chunksize=50000))
+    return sum(1 for _ in iter_spreadsheet_rows(file_obj, is_csv))
+
+def bulk_ingest_jobs(rows, upload_id, added_by, total, progress_callback=None):
+    # rows: (satır no, başlık, açıklama) üreten herhangi bir yineleyici. Satırlar pencereler
+    # halinde tekilleştirilir, gömülür ve yazılır; her pencereden sonra
+    # bulk_upload_checkpoints/{upload_id} güncellenir, böylece yarıda kalan bir yükleme
+    # kaldığı satırdan devam eder ve önceki embedding'ler tekrar ödenmez.
+    # Gömülemeyen bir satır olursa checkpoint o satırın ötesine geçmez ve yükleme durur;
+    # sonraki deneme o satırdan başlar (stats["stopped_at"]).
+    checkpoint_ref = db.collection("bulk_upload_checkpoints").document(upload_id)
+    start_row = get_bulk_checkpoint(upload_id)
+    job_index = get_job_index()
+    seen_hashes = set()
+    stats = {"uploaded": 0, "duplicates": 0, "blank": 0, "failed": 0, "stopped_at": None}
+    pending = (row for row in rows if row[0] >= start_row)
+    checkpoint_row = start_row
+    while True:
+        window = list(itertools.islice(pending, BULK_WINDOW_SIZE))
+        if not window:
+            break
+        window_end = window[-1][0] + 1
+
+        fresh = []
+        for row, title, description in window:
+            # Başlığı ve açıklaması boş satırlar (ör. tablonun sonundaki boş satırlar) hash'lenmez ve gömülmez.
+            if not title.strip() and not description.strip():
+                stats["blank"] += 1
+                continue
+            content_hash = job_content_hash(title, description)
+            if content_hash in job_index.content_hashes or content_hash in seen_hashes:
+                stats["duplicates"] += 1
+                continue
+            seen_hashes.add(content_hash)
+            fresh.append((row, title, description, content_hash))
+
+        texts = [f"Title: {title}\n\nDescription: {description}" for _, title, description, _ in fresh]
+        window_base = window[0][0]
+
+        def report_embedding(done, window_total):
+            if progress_callback:
+                progress_callback(window_base + int(len(window) * done / max(window_total, 1)), total, "Embedding")
+
+        window_vectors = get_embeddings_batch(texts, progress_callback=report_embedding)
+
+        failed_rows = [row for (row, _, _, _), job_vector in zip(fresh, window_vectors) if job_vector is None]
+        stats["failed"] += len(failed_rows)
+        # İlk başarısız satırdan sonrakiler yazılmaz; embedding'leri önbellekte kalır, devamda tekrar ödenmez.
+        next_row = failed_rows[0] if failed_rows else window_end
+
+        writes = []
+        new_ids, new_titles, new_vectors, new_hashes = [], [], [], []
+        new_records = []
+        for (row, title, description, content_hash), job_vector in zip(fresh, window_vectors):
+            if row >= next_row:
+                break
+            doc_ref = db.collection("job_postings").document(f"{upload_id[:16]}_{row:07d}")
+            writes.append((doc_ref, {
+                "title": title,
+                "description": description,
+                "content_hash": content_hash,
+                "created_at": firestore.SERVER_TIMESTAMP,
+                "added_by": added_by,
+                **encode_vector_fields(job_vector)
+            }))
+            new_ids.append(doc_ref.id)
+            new_titles.append(title)
+            new_vectors.append(job_vector)
+            new_hashes.append(content_hash)
+            new_records.append({"id": doc_ref.id, "title": title, "description": description, "added_by": added_by, "created_at": time.time()})
+
+        if failed_rows and not writes:
+            # Hiçbir şey gömülemedi (ör. API kapalı): checkpoint ilerletilmez.
+            stats["stopped_at"] = checkpoint_row
+            break
+        if progress_callback:
+            progress_callback(next_row, total, "Writing")
+        commit_in_batches(writes)
+        # Checkpoint ve sayaç artışı aynı batch'te: yeniden işlenen pencere iki kez sayılmaz.
+        checkpoint_batch = db.batch()
+        checkpoint_batch.set(checkpoint_ref, {
+            "next_row": next_row,
+            "total_rows": total,
+            "added_by": added_by,
+            "updated_at": firestore.SERVER_TIMESTAMP
+        })
+        if platform_counters_ref().get().exists:
+            increment_platform_counter("total_jobs", len(writes), batch=checkpoint_batch)
+        checkpoint_batch.commit()
+        checkpoint_row = next_row
+        job_index.add_many(new_ids, new_titles, new_vectors, content_hashes=new_hashes)
+        add_records_to_text_index(get_job_text_index(), job_index, new_records)
+        get_match_precomputer().notify_jobs_added()
+        get_analysis_cache().invalidate_jobs(new_ids)
+        stats["uploaded"] += len(writes)
+        if failed_rows:
+            stats["stopped_at"] = next_row
+            break
+    return start_row, stats
+
+def load_user_profile(user_id):
+    doc = db.collection("user_profiles").document(user_id).get(field_paths=["cv_text"])
+    return {"exists": doc.exists, "cv_text": doc.to_dict().get("cv_text", "") if doc.exists else ""}
+
+def get_session_profile(user_id):
+    # Profil oturum başına bir kez okunur; yeniden çalıştırmalar (her widget etkileşimi)
+    # Firestore'a gitmez. Kaydetme remember_session_profile ile önbelleği de günceller.
+    profile = st.session_state.get('user_profile')
+    if profile is not None and profile["uid"] == user_id:
+        return profile
+    try:
+        profile = {"uid": user_id, **load_user_profile(user_id)}
     except Exception as e:
         st.error(f"Profilinizden CV'niz çekilirken hata oluştu: {e}")
-        return ""
+        # Önbelleğe alınmaz, sonraki çalıştırmada tekrar denenir; varlığı bilinmiyor.
+        return {"uid": user_id, "exists": None, "cv_text": ""}
+    st.session_state['user_profile'] = profile
+    return profile
+
+def remember_session_profile(user_id, cv_text):
+    st.session_state['user_profile'] = {"uid": user_id, "exists": True, "cv_text": cv_text}
+
+def analyze_and_cache(prepared_cv, cv_hash, job):
+    # Erken durdurulan çalıştırmalarda bile biten analizler sonraki tıklama için önbelleğe yazılır.
+    # cv_hash her zaman özgün CV metninin hash'idir, prepared_cv ise bütçeye sığdırılmış hali.
+    analysis_data = get_gemini_analysis(prepared_cv, job['description'])
+    if analysis_data and analysis_data.get("score") is not None:
+        get_analysis_cache().put(cv_hash, job["id"], job["hash"], analysis_data)
+    return analysis_data
+
+def render_result_card(rank, title, score, analysis_data):
+    with st.container(border=True):
+        col_metric, col_details = st.columns([0.2, 0.8])
+        with col_metric:
+            st.metric(label=f"Rank #{rank} Match", value=f"{score}%")
+        with col_details:
+            st.subheader(title)
+            with st.expander("Click to see detailed AI analysis"):
+                st.subheader("Summary")
+                st.write(analysis_data.get("summary", "N/A"))
+                st.subheader("Strengths (Pros)")
+                # (GÜNCELLENDİ) Eğer veri yoksa "N/A" göstermek için
+                pros = analysis_data.get("pros", [])
+                if pros:
+                    for pro in pros: st.markdown(f"* {pro}")
+                else:
+                    st.write("N/A") 
+                st.subheader("Weaknesses (Cons)")
+                # (GÜNCELLENDİ) Eğer veri yoksa "N/A" göstermek için
+                cons = analysis_data.get("cons", [])
+                if cons:
+                    for con in cons: st.markdown(f"* {con}")
+                else:
+                    st.write("N/A")
+    st.divider()
+
+def top_results_settled(analysis_results, top_n, margin, pending_ranks):
+    # result["job"]["rank"] adayın arama sırasıdır (0 = en benzer). Bekleyen adayların alabileceği
+    # en yüksek skor, arama sırasında en iyi bekleyen adaydan daha geride olup analizi bitmiş
+    # adayların en yüksek skoruyla tahmin edilir (yoksa ilk N dışındaki en yüksek skorla).
+    # N'inci sonuç bu tahmini en az margin puan geçiyorsa sıralama oturmuş sayılır.
+    if len(analysis_results) <= top_n:
+        return False
+    if not pending_ranks:
+        return True
+    scores = sorted((result["score"] for result in analysis_results), reverse=True)
+    best_pending_rank = min(pending_ranks)
+    behind = [result["score"] for result in analysis_results if result["job"]["rank"] > best_pending_rank]
+    pending_ceiling = max(behind) if behind else scores[top_n]
+    return scores[top_n - 1] - pending_ceiling >= margin
+
+# --- BELGE YÜKLEME (PDF/DOCX/ZIP) ---
+UPLOAD_COPY_CHUNK = 1024 * 1024
+
+@st.cache_resource
+def get_extraction_pool():
+    return create_extraction_pool()
+
+def extract_files(paths):
+    # Bir işçi çökerse (bozuk PDF, bellek yetersizliği) havuz kalıcı olarak bozulur ve sonraki
+    # her submit BrokenProcessPool fırlatır. Havuz yeniden kurulur, bitmemiş dosyalar bir kez
+    # daha denenir; ikinci çökmede kalanlar hata olarak döner.
+    remaining = list(paths)
+    for attempt in range(2):
+        pool = get_extraction_pool()
+        finished = set()
+        broken = False
+        try:
+            for result in extract_many(pool, remaining):
+                if isinstance(result[4], BrokenProcessPool):
+                    broken = True
+                    continue
+                finished.add(result[0])
+                yield result
+        except BrokenProcessPool:
+            broken = True
+        remaining = [path for path in remaining if path not in finished]
+        if not broken:
+            return
+        pool.shutdown(wait=False, cancel_futures=True)
+        get_extraction_pool.clear()
+    for path in remaining:
+        yield path, "", 0, 0.0, BrokenProcessPool("text extraction worker crashed")
+
+def copy_to_temp(source, directory, filename):
+    path = os.path.join(directory, filename)
+    with open(path, "wb") as f:
+        shutil.copyfileobj(source, f, UPLOAD_COPY_CHUNK)
+    return path
+
+def extract_uploaded_cv(uploaded_file):
+    # Yüklenen dosya her yeniden çalıştırmada tekrar işlenmesin diye sonuç oturumda tutulur.
+    cache_key = f"extracted_cv_{uploaded_file.file_id}"
+    if cache_key not in st.session_state:
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                uploaded_file.seek(0)
+                path = copy_to_temp(uploaded_file, directory, os.path.basename(uploaded_file.name))
+                _, text, parts, seconds, error = next(extract_files([path]))
+        except Exception as e:
+            st.error(f"An error occurred while reading '{uploaded_file.name}': {e}")
+            return None
+        if error or not text:
+            st.error(f"Could not read text from '{uploaded_file.name}': {error or 'no text found'}")
+            return None
+        st.session_state[cache_key] = (text, f"Extracted {len(text):,} characters from {parts} pages/paragraphs in {seconds:.2f} s.")
+    text, timing = st.session_state[cache_key]
+    st.caption(timing)
+    return text
+
+def title_from_filename(filename):
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    return re.sub(r"[_\-]+", " ", stem).strip() or "No Title"
+
+def extract_jobs_from_zip(zip_file, progress_callback=None):
+    # Arşiv üyeleri tek tek geçici dosyalara akıtılır ve süreç havuzunda çıkarılır.
+    # Sonuçlar dosya adına göre sıralanır ki checkpoint satır numaraları tekrar yüklemede aynı kalsın.
+    results, timings = [], []
+    with tempfile.TemporaryDirectory() as directory:
+        paths = []
+        zip_file.seek(0)
+        with zipfile.ZipFile(zip_file) as archive:
+            for member in sorted(archive.infolist(), key=lambda m: m.filename):
+                if member.is_dir() or not member.filename.lower().endswith(SUPPORTED_EXTENSIONS):
+                    continue
+                with archive.open(member) as source:
+                    paths.append(copy_to_temp(source, directory, f"{len(paths):06d}_{os.path.basename(member.filename)}"))
+        for done, (path, text, parts, seconds, error) in enumerate(extract_files(paths), 1):
+            filename = os.path.basename(path).split("_", 1)[1]
+            timings.append({"file": filename, "parts": parts, "characters": len(text), "seconds": round(seconds, 3), "error": str(error or "")})
+            if text:
+                results.append((os.path.basename(path), title_from_filename(filename), text))
+            if progress_callback:
+                progress_callback(done, len(paths))
+    results.sort()
+    return [title for _, title, _ in results], [text for _, _, text in results], timings
+
+# --- OTURUM KİMLİĞİ ---
+TOKEN_EXPIRY_MARGIN = 300            # Bitişine bu kadar saniye kalan token önceden yenilenir
+
+def verify_session_token(token):
+    # İmza yerelde doğrulanır; Google'ın açık anahtarları firebase_admin tarafından
+    # Cache-Control süresince önbellekte tutulduğu için çoğu çağrı ağa çıkmaz.
+    claims = auth.verify_id_token(token, clock_skew_seconds=10)
+    return {"token": token, "uid": claims["uid"], "exp": claims["exp"]}
+
+def refresh_rejected(error):
+    # pyrebase HTTP hatasını orijinaliyle sarar; 4xx yanıtı refresh token'ın reddedildiği anlamına gelir.
+    # Bağlantı hataları ve 5xx geçicidir.
+    original = error.args[0] if error.args and isinstance(error.args[0], requests.exceptions.HTTPError) else error
+    response = getattr(original, "response", None)
+    return response is not None and 400 <= response.status_code < 500
+
+def get_session_uid():
+    # uid ve token bitiş zamanı oturumda tutulur: token değişmedikçe ve süresi dolmadıkça
+    # tekrar doğrulanmaz. Süresi yaklaşan token refresh token ile saatte bir yenilenir.
+    # Sadece geçersiz token veya reddedilen refresh None döner (oturum kapanır); ağ hataları
+    # oturumu kapatmaz, kullanıcı tekrar deneyebilir.
+    token = st.session_state['user_token']
+    identity = st.session_state.get('user_identity')
+    if identity is not None and identity["token"] == token and identity["exp"] - TOKEN_EXPIRY_MARGIN > time.time():
+        return identity["uid"]
+    try:
+        if identity is not None and identity["token"] == token and st.session_state.get('user_refresh_token'):
+            refreshed = auth_client.refresh(st.session_state['user_refresh_token'])
+            token = refreshed['idToken']
+            st.session_state['user_token'] = token
+            st.session_state['user_refresh_token'] = refreshed['refreshToken']
+        identity = verify_session_token(token)
+    except (auth.InvalidIdTokenError, auth.ExpiredIdTokenError, auth.RevokedIdTokenError) as e:
+        print(f"Oturum doğrulanamadı: {e}")
+        return None
+    except requests.exceptions.HTTPError as e:
+        if refresh_rejected(e):
+            print(f"Oturum yenilenemedi: {e}")
+            return None
+        st.error(f"Could not refresh your session right now. Please try again in a moment. ({e})")
+        st.stop()
+    except Exception as e:
+        st.error(f"Could not verify your session right now. Please try again in a moment. ({e})")
+        st.stop()
+    st.session_state['user_identity'] = identity
+    return identity["uid"]
+
+def clear_session_user():
+    st.session_state['user_email'] = None
+    st.session_state['user_token'] = None
+    for key in ('user_refresh_token', 'user_identity', 'user_profile'):
+        st.session_state.pop(key, None)
+
+def is_admin():
+    return st.session_state['user_email'] in st.secrets.get("ADMIN_EMAILS", [])
 
 # --- ANA UYGULAMA FONKSİYONU ---
 def main_app():
@@ -185,8 +1949,7 @@ def main_app():
     with col2:
         st.write(f"Logged in as: `{st.session_state['user_email']}`")
         if st.button("Logout", use_container_width=True):
-            st.session_state['user_email'] = None
-            st.session_state['user_token'] = None
+            clear_session_user()
             st.rerun() 
             
     st.markdown("---") 
@@ -205,9 +1968,14 @@ def main_app():
 
     st.markdown("---")
     
-    user_id = auth_client.get_account_info(st.session_state['user_token'])['users'][0]['localId']
+    user_id = get_session_uid()
+    if user_id is None:
+        # Geçersiz veya yenilenemeyen token: oturum kapatılıp giriş sayfasına dönülür.
+        clear_session_user()
+        st.rerun()
+    profile = get_session_profile(user_id)
 
-    tab1, tab2, tab3 = st.tabs(["🚀 Auto-Matcher", "📝 Job Management", "👤 My Profile"])
+    tab1, tab2, tab3, tab4 = st.tabs(["🚀 Auto-Matcher", "📝 Job Management", "👤 My Profile", "🔎 Find Candidates"])
 
     # --- (GÜNCELLENDİ) Sekme 1: Auto-Matcher (Hızlandırıldı) ---
   # --- Sekme 1: Auto-Matcher ---
@@ -215,116 +1983,252 @@ def main_app():
         st.header("Find the Best Jobs for Your CV")
         st.markdown("We will use the CV saved in your 'My Profile' tab. If it's empty, please paste your CV below.")
         
-        saved_cv = get_user_cv(user_id)
+        saved_cv = profile["cv_text"]
+        match_precomputer = get_match_precomputer()
         
         with st.container(border=True):
-            cv_text = st.text_area("📄 Your CV Text:", value=saved_cv, height=350)
+            matcher_cv_file = st.file_uploader("...or upload your CV as PDF/DOCX", type=["pdf", "docx"], key="matcher_cv_file")
+            uploaded_cv = extract_uploaded_cv(matcher_cv_file) if matcher_cv_file is not None else None
+            cv_text = st.text_area("📄 Your CV Text:", value=uploaded_cv or saved_cv, height=350)
         
-        CANDIDATE_POOL_SIZE = 10 
         TOP_N_RESULTS = 5       
+
+        with st.expander("🎯 Filters"):
+            required_terms_input = st.text_input(
+                "Required keywords (comma-separated)", key="required_terms",
+                placeholder="e.g. kubernetes, aws, cissp", help="Only jobs whose title or description contains every keyword are considered."
+            )
+            only_my_jobs = st.checkbox("Only jobs I posted", key="only_my_jobs")
+            use_posted_after = st.checkbox("Only jobs posted after a date", key="use_posted_after")
+            posted_after = st.date_input("Posted after", key="posted_after", disabled=not use_posted_after)
+        required_terms = [term.strip() for term in required_terms_input.split(",") if term.strip()]
+        job_filters = {
+            "required_terms": required_terms,
+            "added_by": [st.session_state['user_email'], f"bulk_upload_{st.session_state['user_email']}"] if only_my_jobs else [],
+            "created_after": time.mktime(posted_after.timetuple()) if use_posted_after else None,
+        }
+        has_filters = bool(required_terms or only_my_jobs or use_posted_after)
+        
+        with st.expander("⚙️ Retrieval settings"):
+            retrieval_mode = st.radio("Retrieval mode", RETRIEVAL_MODES, key="retrieval_mode", horizontal=True)
+            use_hybrid = retrieval_mode == RETRIEVAL_MODES[0]
+            lexical_weight = st.slider(
+                "Keyword weight in hybrid ranking", 0.0, 1.0, HYBRID_LEXICAL_WEIGHT, 0.05, key="lexical_weight", disabled=not use_hybrid,
+                help="0 ranks by meaning only, 1 by keyword overlap only."
+            )
+            progressive = st.toggle("Show results as each analysis arrives", value=True, key="progressive_results")
+            early_stop = st.checkbox("Stop early once the top results are settled", value=False, key="early_stop", disabled=not progressive)
+            early_stop_margin = st.slider(
+                "Early-stop margin (score points)", 0, 30, 10, key="early_stop_margin", disabled=not (progressive and early_stop),
+                help=f"Remaining analyses are cancelled once your #{TOP_N_RESULTS} result leads, by at least this many points, "
+                     "the best score seen among analyzed jobs that ranked below the pending ones in the search."
+            )
+            search_backend = st.selectbox("Candidate search backend", SEARCH_BACKENDS, key="search_backend")
+            nprobe = st.slider("IVF clusters to probe (higher = better recall, slower)", 1, 64, IVF_DEFAULT_NPROBE, key="ivf_nprobe")
+            if st.button("Measure recall@10 against exact search"):
+                job_vectors = get_job_index().snapshot()[0]
+                if len(job_vectors) < IVF_MIN_SIZE:
+                    st.info(f"Only {len(job_vectors)} jobs in the pool; exact search is used below {IVF_MIN_SIZE} jobs.")
+                else:
+                    with st.spinner("Measuring recall..."):
+                        recall, exact_ms, ivf_ms = get_job_searcher().measure_recall(job_vectors, k=10, nprobe=nprobe)
+                    st.write(f"recall@10: **{recall:.3f}** | exact: {exact_ms:.2f} ms/query | IVF: {ivf_ms:.2f} ms/query")
+            scheduler_metrics = get_gemini_scheduler().metrics()
+            st.caption(
+                f"Gemini scheduler: {scheduler_metrics['queue_depth']} queued, {scheduler_metrics['in_flight']} in flight, "
+                f"wait p50 {scheduler_metrics['wait_p50_ms']:.0f} ms / p95 {scheduler_metrics['wait_p95_ms']:.0f} ms, "
+                f"{scheduler_metrics['retries']} retries, {scheduler_metrics['failed']} failed"
+            )
+            usage = get_analysis_usage_log().summary()
+            if usage:
+                st.caption(
+                    f"Gemini calls: {usage['calls']}, avg {usage['avg_prompt_tokens']:.0f} tokens in / "
+                    f"{usage['avg_output_tokens']:.0f} out, latency p50 {usage['latency_p50']:.2f}s / p95 {usage['latency_p95']:.2f}s"
+                )
+            cache_stats = get_embedding_cache().stats
+            st.caption(
+                f"Embedding cache: {cache_stats['memory_hits']} memory hits, "
+                f"{cache_stats['disk_hits']} disk hits, {cache_stats['misses']} misses"
+            )
+
+        if is_admin():
+            with st.expander("📊 Latency breakdown (admin)"):
+                tracer = get_tracer()
+                stage_rows = tracer.stage_stats()
+                if stage_rows:
+                    st.dataframe(pd.DataFrame(stage_rows).set_index("stage").round(2), use_container_width=True)
+                else:
+                    st.caption("No traced requests yet.")
+                if tracer.last_trace:
+                    last = tracer.last_trace
+                    st.caption(f"Last request ({last['name']}, {last['status']}): {last['total_ms']:.0f} ms total")
+                    st.dataframe(pd.DataFrame(last["spans"]), use_container_width=True)
+                st.caption(f"Traces are appended to `{TRACE_JSONL_PATH}` (rotated to `.1` at {TRACE_JSONL_MAX_BYTES // (1024 * 1024)} MB); Prometheus metrics are written to `{TRACE_PROMETHEUS_PATH}`.")
         
+        CANDIDATE_POOL_SIZE = HYBRID_CANDIDATE_POOL_SIZE if use_hybrid else VECTOR_CANDIDATE_POOL_SIZE
+
         if st.button(f"Find My Top {TOP_N_RESULTS} Matches", type="primary", use_container_width=True):
             if cv_text:
                 start_time = time.time() 
+                trace = start_trace("auto_matcher")
                 
                 # --- Adım 1: Hızlı Filtreleme (Vektör Arama) ---
                 with st.spinner(f"Step 1/3: Searching all jobs for the top {CANDIDATE_POOL_SIZE} candidates..."):
-                    all_jobs = get_job_postings_with_vectors()
-                    if not all_jobs:
+                    job_vectors, job_ids, job_titles = get_job_index().snapshot()
+                    if len(job_ids) == 0:
+                        finish_trace(trace, "no_jobs")
                         st.warning("No job postings found. Please add jobs first.")
                         st.stop()
                     
-                    cv_vector = get_embedding(cv_text)
-                    if not cv_vector:
-                        st.error("Could not generate fingerprint for your CV. Aborting.")
+                    # Kayıtlı CV değişmediyse arka planda hesaplanmış adaylar kullanılır.
+                    # Filtreler önceden hesaplanmış sıralamada yok, o durumda tam arama yapılır.
+                    with trace_stage("precomputed_lookup") as span:
+                        precomputed = match_precomputer.get_top_jobs(user_id, n_jobs=len(job_ids)) if normalize_text(cv_text) == normalize_text(saved_cv) and not has_filters else None
+                        span["cache_hit"] = precomputed is not None and len(precomputed[0]) > 0
+                    if span["cache_hit"]:
+                        st.caption("Using precomputed candidates for your saved CV.")
+                        if use_hybrid:
+                            top_candidate_indices, _ = hybrid_search(
+                                job_vectors, None, cv_text, CANDIDATE_POOL_SIZE, lexical_weight=lexical_weight, vector_rows=precomputed[0]
+                            )
+                        else:
+                            top_candidate_indices = precomputed[0][:CANDIDATE_POOL_SIZE]
+                    else:
+                        cv_vector = get_embedding(cv_text)
+                        if cv_vector is None:
+                            finish_trace(trace, "embedding_failed")
+                            st.error("Could not generate fingerprint for your CV. Aborting.")
+                            st.stop()
+                            
+                        cv_vector_np = np.asarray(cv_vector, dtype=np.float32)
+                        with trace_stage("vector_search", backend=search_backend, rows=len(job_ids), hybrid=use_hybrid):
+                            if use_hybrid or has_filters:
+                                top_candidate_indices, _ = hybrid_search(
+                                    job_vectors, cv_vector_np, cv_text, CANDIDATE_POOL_SIZE, backend=search_backend, nprobe=nprobe,
+                                    lexical_weight=lexical_weight if use_hybrid else 0.0, filters=job_filters
+                                )
+                            else:
+                                top_candidate_indices, _ = get_job_searcher().search(
+                                    job_vectors, cv_vector_np, CANDIDATE_POOL_SIZE, backend=search_backend, nprobe=nprobe
+                                )
+                    pool_size = len(top_candidate_indices)
+                    if pool_size == 0:
+                        finish_trace(trace, "no_candidates")
+                        st.warning("No job postings match your filters.")
+                        st.stop()
+                    try:
+                        with trace_stage("description_fetch", rows=pool_size):
+                            job_descriptions = fetch_job_descriptions([job_ids[index] for index in top_candidate_indices])
+                    except Exception as e:
+                        finish_trace(trace, "error")
+                        st.error(f"Could not load the job descriptions: {e}")
                         st.stop()
-                        
-                    job_vectors = np.array([job['vector'] for job in all_jobs])
-                    cv_vector_np = np.array(cv_vector)
-                    similarities = np.dot(job_vectors, cv_vector_np)
-                    
-                    pool_size = min(len(all_jobs), CANDIDATE_POOL_SIZE)
-                    top_candidate_indices = np.argsort(similarities)[-pool_size:][::-1]
 
                 # --- Adım 2: Paralel Analiz (Hızlı) ---
                 analysis_results = []
+                analysis_cache = get_analysis_cache()
+                cv_hash = text_hash(cv_text)
+                uncached_jobs = []
+                with trace_stage("analysis_cache_lookup") as span:
+                    for rank, index in enumerate(top_candidate_indices):
+                        matched_job = {
+                            "rank": rank,
+                            "id": job_ids[index],
+                            "title": job_titles[index],
+                            "description": job_descriptions.get(job_ids[index], "No Description"),
+                        }
+                        matched_job["hash"] = text_hash(matched_job["description"])
+                        analysis_data = analysis_cache.get(cv_hash, matched_job["id"], matched_job["hash"])
+                        if analysis_data and analysis_data.get("score") is not None:
+                            analysis_results.append({
+                                "job": matched_job,
+                                "data": analysis_data,
+                                "score": int(analysis_data.get("score", 0))
+                            })
+                        else:
+                            uncached_jobs.append(matched_job)
+                    span["hits"] = len(analysis_results)
+                    span["cache_hit"] = not uncached_jobs
+
+                completed_count = pool_size - len(uncached_jobs)
+                status_placeholder = st.empty()
                 # (GÜNCELLENDİ) İlerleme çubuğunun başlangıç metni
-                progress_bar = st.progress(0, text=f"Step 2/3: Analyzing {pool_size} candidates... (0%)") 
+                progress_bar = st.progress(completed_count / max(pool_size, 1), text=f"Step 2/3: Analyzing {len(uncached_jobs)} candidates ({completed_count} cached)...") 
+                results_placeholder = st.empty()
+
+                def show_ranked_results():
+                    with trace_stage("render", results=len(analysis_results)):
+                        sorted_results = sorted(analysis_results, key=lambda x: x["score"], reverse=True)
+                        with results_placeholder.container():
+                            st.markdown("---")
+                            for i, result in enumerate(sorted_results[:TOP_N_RESULTS]):
+                                render_result_card(i + 1, result["job"]["title"], result["score"], result["data"])
 
-                with concurrent.futures.ThreadPoolExecutor(max_workers=pool_size) as executor:
+                if progressive and analysis_results:
+                    show_ranked_results()
+
+                stopped_early = False
+                pending_ranks = {matched_job["rank"] for matched_job in uncached_jobs}
+                if not (progressive and early_stop and top_results_settled(analysis_results, TOP_N_RESULTS, early_stop_margin, pending_ranks)):
+                    with trace_stage("cv_prepare"):
+                        prepared_cv = prepare_cvs_for_analysis([cv_text])[cv_text] if uncached_jobs else cv_text
+                    scheduler = get_gemini_scheduler()
                     future_to_job = {}
-                    for index in top_candidate_indices:
-                        matched_job = all_jobs[index]
-                        future = executor.submit(get_gemini_analysis, cv_text, matched_job['description'])
+                    for matched_job in uncached_jobs:
+                        future = scheduler.submit(current_session_id(), "analysis", analyze_and_cache, prepared_cv, cv_hash, matched_job)
                         future_to_job[future] = matched_job
-                    
-                    completed_count = 0
-                    for future in concurrent.futures.as_completed(future_to_job):
-                        matched_job = future_to_job[future]
-                        try:
-                            analysis_data = future.result() 
-                            if analysis_data and analysis_data.get("score") is not None:
-                                analysis_results.append({
-                                    "job": matched_job,
-                                    "data": analysis_data,
-                                    "score": int(analysis_data.get("score", 0))
-                                })
-                        except Exception as e:
-                            st.error(f"Error analyzing job '{matched_job['title']}': {e}")
+                    try:
                         
-                        completed_count += 1
-                        percent_complete = completed_count / pool_size
-                        # (GÜNCELLENDİ) İlerleme çubuğunun güncelleme metni (yüzde gösterir)
-                        progress_bar.progress(percent_complete, text=f"Step 2/3: Analyzing... {int(percent_complete * 100)}% complete") 
+                        for future in concurrent.futures.as_completed(future_to_job):
+                            matched_job = future_to_job[future]
+                            pending_ranks.discard(matched_job["rank"])
+                            try:
+                                analysis_data = future.result() 
+                                if analysis_data and analysis_data.get("score") is not None:
+                                    analysis_results.append({
+                                        "job": matched_job,
+                                        "data": analysis_data,
+                                        "score": int(analysis_data.get("score", 0))
+                                    })
+                                    if progressive:
+                                        show_ranked_results()
+                            except Exception as e:
+                                st.error(f"Error analyzing job '{matched_job['title']}': {e}")
+                            
+                            completed_count += 1
+                            percent_complete = completed_count / pool_size
+                            # (GÜNCELLENDİ) İlerleme çubuğunun güncelleme metni (yüzde gösterir)
+                            progress_bar.progress(percent_complete, text=f"Step 2/3: Analyzing... {int(percent_complete * 100)}% complete") 
+
+                            if progressive and early_stop and completed_count < pool_size and top_results_settled(analysis_results, TOP_N_RESULTS, early_stop_margin, pending_ranks):
+                                stopped_early = True
+                                break
+                    finally:
+                        # Erken durdurmada kuyruktaki çağrılar iptal edilir, çalışanlar beklenmez.
+                        for future in future_to_job:
+                            future.cancel()
+                else:
+                    stopped_early = len(uncached_jobs) > 0
                 
                 progress_bar.empty()
 
                 # --- Adım 3: Yeniden Sırala ve Göster ---
                 with st.spinner(f"Step 3/3: Ranking results and showing the Top {TOP_N_RESULTS}..."):
                     if not analysis_results:
+                        finish_trace(trace, "analysis_failed")
                         st.error("AI analysis failed for all candidates. Please try again.")
                         st.stop()
 
-                    sorted_results = sorted(analysis_results, key=lambda x: x["score"], reverse=True)
+                    if not progressive:
+                        show_ranked_results()
                     
                     end_time = time.time()
-                    st.success(f"Done! Found and ranked your Top {TOP_N_RESULTS} matches in {end_time - start_time:.2f} seconds.")
+                    finish_trace(trace, "early_stop" if stopped_early else "ok")
+                    early_note = f" (stopped early after {completed_count} of {pool_size} analyses)" if stopped_early else ""
+                    status_placeholder.success(f"Done! Found and ranked your Top {TOP_N_RESULTS} matches in {end_time - start_time:.2f} seconds{early_note}.")
                     
                     # (YENİ EKLEME) İşte animasyon burada!
                     st.balloons() 
-                    
-                    st.markdown("---")
-
-                    for i, result in enumerate(sorted_results[:TOP_N_RESULTS]):
-                        rank = i + 1
-                        job_title = result["job"]["title"]
-                        score = result["score"]
-                        analysis_data = result["data"]
-                        
-                        with st.container(border=True):
-                            col_metric, col_details = st.columns([0.2, 0.8])
-                            with col_metric:
-                                st.metric(label=f"Rank #{rank} Match", value=f"{score}%")
-                            with col_details:
-                                st.subheader(job_title)
-                                with st.expander("Click to see detailed AI analysis"):
-                                    st.subheader("Summary")
-                                    st.write(analysis_data.get("summary", "N/A"))
-                                    st.subheader("Strengths (Pros)")
-                                    # (GÜNCELLENDİ) Eğer veri yoksa "N/A" göstermek için
-                                    pros = analysis_data.get("pros", [])
-                                    if pros:
-                                        for pro in pros: st.markdown(f"* {pro}")
-                                    else:
-                                        st.write("N/A") 
-                                    st.subheader("Weaknesses (Cons)")
-                                    # (GÜNCELLENDİ) Eğer veri yoksa "N/A" göstermek için
-                                    cons = analysis_data.get("cons", [])
-                                    if cons:
-                                        for con in cons: st.markdown(f"* {con}")
-                                    else:
-                                        st.write("N/A")
-                        st.divider()
             else:
                 st.warning("Please paste your CV text to find matches.")
                 
@@ -343,17 +2247,27 @@ def main_app():
                 if job_title and job_description:
                     with st.spinner("Generating AI fingerprint (vector)..."):
                         job_vector = get_embedding(f"Title: {job_title}\n\nDescription: {job_description}")
-                    if job_vector:
+                    if job_vector is not None:
                         try:
-                            db.collection("job_postings").document().set({
+                            doc_ref = db.collection("job_postings").document()
+                            content_hash = job_content_hash(job_title, job_description)
+                            doc_ref.set({
                                 "title": job_title,
                                 "description": job_description,
+                                "content_hash": content_hash,
                                 "created_at": firestore.SERVER_TIMESTAMP,
-                                "vector": job_vector,
-                                "added_by": st.session_state['user_email']
+                                "added_by": st.session_state['user_email'],
+                                **encode_vector_fields(job_vector)
                             })
+                            get_job_index().add(doc_ref.id, job_title, job_vector, content_hash)
+                            add_records_to_text_index(get_job_text_index(), get_job_index(), [{
+                                "id": doc_ref.id, "title": job_title, "description": job_description,
+                                "added_by": st.session_state['user_email'], "created_at": time.time(),
+                            }])
+                            increment_platform_counter("total_jobs")
+                            get_match_precomputer().notify_jobs_added()
                             st.success(f"Successfully added '{job_title}'!")
-                            st.cache_data.clear() 
+                            get_platform_counters.clear()
                         except Exception as e: st.error(f"Error saving to Firebase: {e}")
                     else: st.error("Could not generate AI fingerprint.")
                 else: st.warning("Please fill in both fields.")
@@ -368,60 +2282,144 @@ def main_app():
         
         if uploaded_file is not None:
             try:
-                if uploaded_file.name.endswith('.csv'):
-                    df = pd.read_csv(uploaded_file)
-                else:
-                    df = pd.read_excel(uploaded_file)
+                is_csv = uploaded_file.name.endswith('.csv')
+                # Başlık kontrolü, satır sayımı, dosya hash'i ve checkpoint okuması her yeniden çalıştırmada
+                # tekrarlanmasın; checkpoint sadece bir yükleme çalıştıktan sonra tazelenir.
+                file_info_key = f"bulk_file_info_{uploaded_file.file_id}"
+                if file_info_key not in st.session_state:
+                    columns = read_spreadsheet_header(uploaded_file, is_csv)
+                    missing_columns = [column for column in REQUIRED_COLUMNS if column not in columns]
+                    st.session_state[file_info_key] = {
+                        "missing": missing_columns,
+                        "rows": 0 if missing_columns else count_spreadsheet_rows(uploaded_file, is_csv),
+                        "preview": [] if missing_columns else list(itertools.islice(iter_spreadsheet_rows(uploaded_file, is_csv, chunk_rows=5), 5)),
+                        "upload_id": bulk_upload_id(uploaded_file),
+                    }
+                    if not missing_columns:
+                        st.session_state[file_info_key]["next_row"] = get_bulk_checkpoint(st.session_state[file_info_key]["upload_id"])
+                file_info = st.session_state[file_info_key]
+                total_rows = file_info["rows"]
 
-                if 'title' not in df.columns or 'description' not in df.columns:
+                if file_info["missing"]:
                     st.error("Error: File must contain 'title' and 'description' columns.")
                 else:
-                    st.success(f"File '{uploaded_file.name}' read successfully. Found {len(df)} jobs.")
-                    st.dataframe(df.head())
+                    st.success(f"File '{uploaded_file.name}' read successfully. Found {total_rows} jobs.")
+                    st.dataframe(pd.DataFrame(file_info["preview"], columns=["row", "title", "description"]).set_index("row"))
                     
-                    if st.button(f"Process and Upload {len(df)} Jobs", type="primary"):
+                    upload_id = file_info["upload_id"]
+                    resume_row = file_info["next_row"]
+                    if 0 < resume_row < total_rows:
+                        st.info(f"A previous upload of this file stopped after {resume_row} rows. It will resume from row {resume_row + 1}.")
+                    elif resume_row >= total_rows:
+                        st.info("This file has already been uploaded.")
+
+                    if st.button(f"Process and Upload {total_rows} Jobs", type="primary"):
                         st.info("Starting bulk upload... This may take several minutes.")
                         progress_bar_bulk = st.progress(0, text="Starting...")
-                        success_count = 0
-                        batch = db.batch()
-                        
-                        for index, row in df.iterrows():
-                            title = str(row['title'])
-                            description = str(row['description'])
-                            
-                            progress_text = f"Processing ({index + 1}/{len(df)}): {title[:30]}..."
-                            progress_bar_bulk.progress((index + 1) / len(df), text=progress_text)
-                            
-                            job_vector = get_embedding(f"Title: {title}\n\nDescription: {description}")
-                            
-                            if job_vector:
-                                doc_ref = db.collection("job_postings").document()
-                                batch.set(doc_ref, {
-                                    "title": title,
-                                    "description": description,
-                                    "created_at": firestore.SERVER_TIMESTAMP,
-                                    "vector": job_vector,
-                                    "added_by": f"bulk_upload_{st.session_state['user_email']}"
-                                })
-                                success_count += 1
-                        
-                        batch.commit()
-                        st.success(f"Done! Successfully processed and uploaded {success_count} out of {len(df)} jobs.")
-                        st.cache_data.clear()
+                        bulk_start = time.time()
+
+                        def report_progress(done, total, stage):
+                            rate = (done - resume_row) / max(time.time() - bulk_start, 1e-6)
+                            progress_bar_bulk.progress(min(done / max(total, 1), 1.0), text=f"{stage} ({done}/{total}) - {rate:.1f} rows/s")
+
+                        try:
+                            start_row, bulk_stats = bulk_ingest_jobs(
+                                iter_spreadsheet_rows(uploaded_file, is_csv),
+                                upload_id,
+                                f"bulk_upload_{st.session_state['user_email']}",
+                                total_rows,
+                                progress_callback=report_progress
+                            )
+                        finally:
+                            # Yarıda kesilen yükleme de checkpoint'i ilerletmiş olabilir.
+                            file_info["next_row"] = get_bulk_checkpoint(upload_id)
+                        elapsed = time.time() - bulk_start
+                        processed = total_rows - start_row
+                        st.success(
+                            f"Done! Successfully processed and uploaded {bulk_stats['uploaded']} out of {processed} jobs "
+                            f"in {elapsed:.1f} seconds ({processed / max(elapsed, 1e-6):.1f} rows/s). "
+                            f"Skipped {bulk_stats['duplicates']} duplicates and {bulk_stats['blank']} blank rows; "
+                            f"{bulk_stats['failed']} rows could not be embedded."
+                        )
+                        if bulk_stats["stopped_at"] is not None:
+                            st.warning(f"Embedding failed, so the upload stopped at row {bulk_stats['stopped_at'] + 1}. Run it again to resume from there.")
+                        get_platform_counters.clear()
                         
             except Exception as e:
                 st.error(f"An error occurred while processing the file: {e}")
 
 
+        st.divider()
+
+        # Belge arşivinden ilan yükleme
+        st.subheader("OR... Upload a ZIP of Job Description Files")
+        st.markdown("Each **PDF**, **DOCX** or **TXT** file becomes one job; the file name is used as the title.")
+        zip_file = st.file_uploader("Choose a ZIP archive", type=["zip"], key="job_zip_file")
+
+        if zip_file is not None and st.button(f"Extract and Upload Jobs from '{zip_file.name}'", type="primary"):
+            try:
+                extraction_progress = st.progress(0, text="Extracting text...")
+                extraction_start = time.time()
+
+                def report_extraction(done, total):
+                    extraction_progress.progress(done / total, text=f"Extracting text ({done}/{total})...")
+
+                zip_titles, zip_descriptions, timings = extract_jobs_from_zip(zip_file, progress_callback=report_extraction)
+                extraction_progress.empty()
+                st.write(f"Extracted {len(zip_titles)} of {len(timings)} files in {time.time() - extraction_start:.1f} seconds.")
+                st.dataframe(pd.DataFrame(timings), use_container_width=True)
+
+                if zip_titles:
+                    progress_bar_zip = st.progress(0, text="Starting...")
+                    bulk_start = time.time()
+
+                    def report_zip_progress(done, total, stage):
+                        rate = done / max(time.time() - bulk_start, 1e-6)
+                        progress_bar_zip.progress(done / total, text=f"{stage} ({done}/{total}) - {rate:.1f} rows/s")
+
+                    start_row, bulk_stats = bulk_ingest_jobs(
+                        ((row, title, description) for row, (title, description) in enumerate(zip(zip_titles, zip_descriptions))),
+                        bulk_upload_id(zip_file),
+                        f"bulk_upload_{st.session_state['user_email']}",
+                        len(zip_titles),
+                        progress_callback=report_zip_progress
+                    )
+                    st.success(
+                        f"Done! Uploaded {bulk_stats['uploaded']} out of {len(zip_titles) - start_row} extracted jobs. "
+                        f"Skipped {bulk_stats['duplicates']} duplicates and {bulk_stats['blank']} empty files."
+                    )
+                    if bulk_stats["stopped_at"] is not None:
+                        st.warning(f"Embedding failed for {bulk_stats['failed']} files, so the upload stopped at file {bulk_stats['stopped_at'] + 1}. Run it again to resume from there.")
+                    get_platform_counters.clear()
+            except Exception as e:
+                st.error(f"An error occurred while processing the archive: {e}")
+
+        if is_admin():
+            st.divider()
+            with st.expander("🛠️ Admin: Migrate vector storage"):
+                st.markdown(
+                    f"Rewrites job `vector` and profile `cv_vector` fields into the compact "
+                    f"`{VECTOR_STORAGE_DTYPE}` byte format. Documents already migrated are skipped."
+                )
+                if st.button("Run vector storage migration"):
+                    migration_status = st.empty()
+                    for collection, prefix in (("job_postings", "vector"), ("user_profiles", "cv_vector")):
+                        def report_migration(scanned, migrated):
+                            migration_status.write(f"`{collection}`: scanned {scanned}, migrated {migrated}")
+                        scanned, migrated = migrate_vector_storage(collection, prefix, progress_callback=report_migration)
+                        st.write(f"`{collection}`: migrated {migrated} of {scanned} documents.")
+
     # --- Sekme 3: Profilim ---
     with tab3:
         st.header("My Profile")
         st.markdown("Save your CV here so you don't have to paste it every time.")
         
-        current_cv = get_user_cv(user_id)
+        current_cv = profile["cv_text"]
+        profile_cv_file = st.file_uploader("Upload your CV as PDF/DOCX to fill the form below", type=["pdf", "docx"], key="profile_cv_file")
+        uploaded_cv = extract_uploaded_cv(profile_cv_file) if profile_cv_file is not None else None
         
         with st.form("profile_form"):
-            new_cv_text = st.text_area("Your CV Text", value=current_cv, height=400)
+            new_cv_text = st.text_area("Your CV Text", value=uploaded_cv or current_cv, height=400)
             submitted = st.form_submit_button("Save CV to Profile")
             
             if submitted:
@@ -429,19 +2427,124 @@ def main_app():
                     with st.spinner("Generating AI fingerprint for your CV..."):
                         cv_vector = get_embedding(new_cv_text)
                     
-                    if cv_vector:
-                        db.collection("user_profiles").document(user_id).set({
+                    if cv_vector is not None:
+                        profile_ref = db.collection("user_profiles").document(user_id)
+                        is_new_profile = not profile_ref.get().exists if profile["exists"] is None else not profile["exists"]
+                        profile_ref.set({
                             "email": st.session_state['user_email'],
                             "cv_text": new_cv_text,
-                            "cv_vector": cv_vector,
+                            **encode_vector_fields(cv_vector, prefix="cv_vector"),
                             "updated_at": firestore.SERVER_TIMESTAMP
                         }, merge=True)
+                        remember_session_profile(user_id, new_cv_text)
+                        get_profile_index().add(user_id, st.session_state['user_email'], cv_vector)
+                        get_match_precomputer().notify_profile_saved(user_id)
+                        if is_new_profile:
+                            increment_platform_counter("total_profiles")
+                            get_platform_counters.clear()
                         st.success("Your CV has been successfully saved to your profile!")
                     else:
                         st.error("Could not generate AI fingerprint for your CV. Not saved.")
                 except Exception as e:
                     st.error(f"An error occurred while saving your profile: {e}")
 
+    # --- Sekme 4: Aday Bulma (Ters Eşleştirme) ---
+    with tab4:
+        st.header("Find the Best Candidates for a Job")
+        st.markdown("Ranks saved CV profiles against a job posting, then has the AI analyze the closest ones.")
+        st.caption("You can search candidates for the jobs you posted." if not is_admin() else "Admin: all job postings are searchable.")
+
+        CANDIDATE_PROFILE_POOL_SIZE = 10
+        TOP_N_CANDIDATES = 5
+
+        _, all_job_ids, all_job_titles = get_job_index().snapshot()
+        # Aday e-postaları ve CV analizleri sadece ilanın sahibine (veya yöneticiye) gösterilir.
+        if is_admin():
+            owned_rows = range(len(all_job_ids))
+        else:
+            user_email = st.session_state['user_email']
+            owned_mask = get_job_text_index().filter_mask(len(all_job_ids), added_by=[user_email, f"bulk_upload_{user_email}"])
+            owned_rows = np.flatnonzero(owned_mask)
+        title_query = st.text_input("Search job titles", key="candidate_job_query").strip().lower()
+        matching_rows = [int(i) for i in owned_rows if title_query in str(all_job_titles[i]).lower()][:50] if title_query else []
+        selected_row = st.selectbox(
+            "Job posting", matching_rows, format_func=lambda i: all_job_titles[i],
+            placeholder="Type above to search jobs", index=None, key="candidate_job_row"
+        )
+
+        if st.button(f"Find Top {TOP_N_CANDIDATES} Candidates", type="primary", use_container_width=True, disabled=selected_row is None):
+            start_time = time.time()
+            trace = start_trace("candidate_matcher")
+            job_id = all_job_ids[selected_row]
+            job_title = all_job_titles[selected_row]
+
+            # --- Adım 1: Vektör Arama (profiller) ---
+            with st.spinner(f"Step 1/2: Searching all profiles for the top {CANDIDATE_PROFILE_POOL_SIZE} candidates..."):
+                profile_vectors, profile_ids, profile_emails = get_profile_index().snapshot()
+                if len(profile_ids) == 0:
+                    finish_trace(trace, "no_profiles")
+                    st.warning("No saved CV profiles yet.")
+                    st.stop()
+                job_vector = get_job_index().get_vector(job_id)
+                backend = st.session_state.get("search_backend", SEARCH_BACKENDS[0])
+                with trace_stage("vector_search", backend=backend, rows=len(profile_ids)):
+                    top_profile_indices, _ = get_profile_searcher().search(
+                        profile_vectors, job_vector, CANDIDATE_PROFILE_POOL_SIZE,
+                        backend=backend,
+                        nprobe=st.session_state.get("ivf_nprobe", IVF_DEFAULT_NPROBE)
+                    )
+                try:
+                    with trace_stage("description_fetch", rows=len(top_profile_indices) + 1):
+                        job_description = fetch_job_descriptions([job_id]).get(job_id, "No Description")
+                        job = {"id": job_id, "title": job_title, "description": job_description, "hash": text_hash(job_description)}
+                        candidate_cvs = fetch_profile_cvs([profile_ids[index] for index in top_profile_indices])
+                except Exception as e:
+                    finish_trace(trace, "error")
+                    st.error(f"Could not load the job posting or candidate CVs: {e}")
+                    st.stop()
+
+            # --- Adım 2: Gemini ile Yeniden Sıralama ---
+            candidate_results = []
+            analysis_cache = get_analysis_cache()
+            scheduler = get_gemini_scheduler()
+            future_to_candidate = {}
+            uncached_candidates = []
+            for index in top_profile_indices:
+                candidate_cv = candidate_cvs.get(profile_ids[index])
+                if not candidate_cv:
+                    continue
+                cv_hash = text_hash(candidate_cv)
+                analysis_data = analysis_cache.get(cv_hash, job_id, job["hash"])
+                if analysis_data and analysis_data.get("score") is not None:
+                    candidate_results.append((profile_emails[index], analysis_data))
+                else:
+                    uncached_candidates.append((profile_emails[index], candidate_cv, cv_hash))
+            prepared_cvs = prepare_cvs_for_analysis([candidate_cv for _, candidate_cv, _ in uncached_candidates])
+            for email, candidate_cv, cv_hash in uncached_candidates:
+                future = scheduler.submit(current_session_id(), "analysis", analyze_and_cache, prepared_cvs[candidate_cv], cv_hash, job)
+                future_to_candidate[future] = email
+
+            candidate_progress = st.progress(0, text=f"Step 2/2: Analyzing {len(future_to_candidate)} candidates...")
+            for completed, future in enumerate(concurrent.futures.as_completed(future_to_candidate), 1):
+                try:
+                    analysis_data = future.result()
+                    if analysis_data and analysis_data.get("score") is not None:
+                        candidate_results.append((future_to_candidate[future], analysis_data))
+                except Exception as e:
+                    st.error(f"Error analyzing candidate '{future_to_candidate[future]}': {e}")
+                candidate_progress.progress(completed / len(future_to_candidate), text=f"Step 2/2: Analyzing... {completed}/{len(future_to_candidate)}")
+            candidate_progress.empty()
+            finish_trace(trace, "ok" if candidate_results else "analysis_failed")
+
+            if not candidate_results:
+                st.error("AI analysis failed for all candidates. Please try again.")
+            else:
+                candidate_results.sort(key=lambda result: int(result[1].get("score", 0)), reverse=True)
+                st.success(f"Done! Ranked the Top {TOP_N_CANDIDATES} candidates for '{job_title}' in {time.time() - start_time:.2f} seconds.")
+                st.markdown("---")
+                for i, (email, analysis_data) in enumerate(candidate_results[:TOP_N_CANDIDATES]):
+                    render_result_card(i + 1, email, int(analysis_data.get("score", 0)), analysis_data)
+
 # --- LOGIN SAYFASI FONKSİYONU ---
 def login_page():
     st.title("🤖 AI CV Matching Platform")
@@ -476,6 +2579,7 @@ def login_page():
                     user = auth_client.sign_in_with_email_and_password(email, password)
                     st.session_state['user_email'] = user['email']
                     st.session_state['user_token'] = user['idToken']
+                    st.session_state['user_refresh_token'] = user['refreshToken']
                     st.rerun() 
                 except Exception as e:
                     st.warning("Login failed. Please check your email and password.")
@@ -491,6 +2595,7 @@ def login_page():
             if new_email and new_password:
                 try:
                     user = auth_client.create_user_with_email_and_password(new_email, new_password)
+                    increment_platform_counter("total_users")
                     st.success("Account created successfully! Please go to the 'Login' tab to log in.")
                 except Exception as e:
                     error_message = str(e)
@@ -506,7 +2611,8 @@ def login_page():
                 st.warning("Please enter both email and password.")
 
 # --- ANA MANTIK ---
-if st.session_state['user_email']:
-    main_app()
-else:
-    login_page()
+if __name__ == "__main__":
+    if st.session_state['user_email']:
+        main_app()
+    else:
+        login_page()